@@ -10,10 +10,21 @@ try:
     from baev import *
 except ImportError:
     raise ImportError("baev.py not found")
+try:
+    import model
+except ImportError:
+    raise ImportError("model.py not found")
+try:
+    import jsonio
+except ImportError:
+    raise ImportError("jsonio.py not found")
 
 from enum import Enum
+from collections import namedtuple
 import json
+import marshal
 import os
+import io
 try:
     import mmh3
 except ImportError:
@@ -47,6 +58,9 @@ class NodeType(Enum):
     ShapeAnimation          = 24
     Unknown7                = 25
 
+node_type_names = {t.value : t.name for t in NodeType}
+node_type_values = {t.name : t.value for t in NodeType}
+
 class Mode(Enum):
     Generic                 = 0
     Degrees                 = 1
@@ -92,6 +106,40 @@ class CompareOperator(Enum):
 # Parameter order for blackboard
 blackboard_types = ["string", "int", "float", "bool", "vec3f", "ptr"]
 
+# Fixed-layout records (GUIDs are kept as raw 16 byte strings)
+command_format = "<IIifiII16sH2x" # 0x30
+node_header_format = "<HBBIIHHHH16s" # 0x24
+calc_ctrl_format = "<ifIfffff" # 0x20
+# Parameter slots are a flag word followed by the value
+param_formats = {
+    "string" : "<iI",
+    "int" : "<ii",
+    "float" : "<if",
+    "bool" : "<iI",
+    "vec3f" : "<ifff"
+}
+guid_format = "%08x-%04x-%04x-%02x%02x-%02x%02x%02x%02x%02x%02x"
+
+# Binary cache (ASB.to_cache), magic and format version followed by asdict() in marshal format
+cache_magic = b"ASBC"
+cache_version = 3
+cache_marshal_version = 4 # readable by every Python 3 version since 3.4
+cache_header_format = "<4sI"
+
+# File header, counts and section offsets
+header_format = "<4s26I"
+header_size = 0x6C
+ASBHeader = namedtuple("ASBHeader", [
+    "magic", "version", "filename_offset", "command_count", "node_count", "event_count", "partial_count",
+    "sync_control_count", "blackboard_offset", "string_pool_offset",
+    "enum_resolve_offset", # section is identical to AINB and also unused so I won't bother
+    "state_transition_offset", "event_offsets_offset", "partials_offset", "sync_control_offset",
+    "sync_control_indices_offset", "calc_controller_offset",
+    "calc_controller_count", # this count doesn't line up, might be because some controllers calculate the same value
+    "bone_groups_offset", "bone_group_count", "string_pool_size", "transitions_offset", "valid_tags_offset",
+    "as_markings_offset", "expression_offset", "command_groups_offset", "material_blend_offset"
+])
+
 class Blackboard:
     def __init__(self, stream, string_pool):
         self.stream = stream
@@ -161,7 +209,7 @@ class Blackboard:
         return value
 
 class ASB:
-    def __init__(self, data, stream=ReadStream(b''), string_pool=ReadStream(b'')):
+    def __init__(self, data, stream=None, string_pool=None):
         if data:
             self.filename = data["Metadata"]["Filename"]
             self.version = int(data["Metadata"]["Version"], 16)
@@ -187,8 +235,8 @@ class ASB:
             self.valid_tags = []
             self.partials = []
             self.material_blend = []
-        self.stream: ReadStream = stream
-        self.string_pool: ReadStream = string_pool
+        self.stream: ReadStream = stream if stream is not None else ReadStream(b'')
+        self.string_pool: StringPool = string_pool if string_pool is not None else StringPool(b'')
         self.calc_ctrl = []
         self.events = []
         self.sync_ctrl = []
@@ -196,7 +244,10 @@ class ASB:
         self.as_markings = []
         self.state_transitions = []
         self.material_blend = []
+        self.typed = False
 
+        seen_markings = set()
+        seen_blends = set()
         for node in self.nodes:
             if "Calc Controllers" in node:
                 self.calc_ctrl += node["Calc Controllers"]
@@ -205,138 +256,164 @@ class ASB:
             if node["Node Type"] == "Event":
                 self.events.append(node["Body"]["Event"])
             if "ASMarking" in node:
-                if node["ASMarking"] not in self.as_markings:
+                key = freeze(node["ASMarking"])
+                if key not in seen_markings:
+                    seen_markings.add(key)
                     self.as_markings.append(node["ASMarking"])
             if node["Node Type"] == "MaterialAnimation":
                 if "Material Blend Setting" in node["Body"]:
-                    if node["Body"]["Material Blend Setting"] not in self.material_blend:
+                    key = freeze(node["Body"]["Material Blend Setting"])
+                    if key not in seen_blends:
+                        seen_blends.add(key)
                         self.material_blend.append(node["Body"]["Material Blend Setting"])
             if "Body" in node and "State Transitions" in node["Body"]:
                 for transition in node["Body"]["State Transitions"]:
                     if transition["State Transition"]:
                         self.state_transitions.append(transition["State Transition"])
         
+        seen_groups = set()
         for transition_group in self.transitions:
             for transition in transition_group["Transitions"]:
-                if "Command Group" in transition and transition["Command Group"] not in self.command_groups:
-                    self.command_groups.append(transition["Command Group"])
-
-    @classmethod
-    def from_binary(cls, data):
-        assert type(data) in [bytes, bytearray], "Data should be bytes or bytearray"
+                if "Command Group" in transition:
+                    key = freeze(transition["Command Group"])
+                    if key not in seen_groups:
+                        seen_groups.add(key)
+                        self.command_groups.append(transition["Command Group"])
+
+    # Parses the 0x6C byte header and sets up the string pool, the sections are read separately
+    # lazy=True leaves the string pool undecoded, strings are then read by offset the first time they're used
+    @staticmethod
+    def open_binary(data, romfs_path="", lazy=False):
+        if type(data) == str:
+            from converter import read_file
+            data = read_file(data, romfs_path)
+        assert type(data) in [bytes, bytearray, memoryview], "Data should be bytes, bytearray or memoryview"
         stream = ReadStream(data)
+        header = ASBHeader._make(stream.read_record(header_format))
+        assert header.magic == b'ASB ', f"Invalid file magic '{header.magic.decode('utf-8')}', expected 'ASB '"
+        assert header.version == 0x417, f"Unsupported version {hex(header.version)}, expected 0x417"
+        string_pool = StringPool(data, header.string_pool_offset, None if lazy else header.string_pool_size)
+        return stream, string_pool, header
 
-        magic = stream.read(4)
-        assert magic == b'ASB ', f"Invalid file magic '{magic.decode('utf-8')}', expected 'ASB '"
-        version = stream.read_u32()
-        assert version == 0x417, f"Unsupported version {hex(version)}, expected 0x417"
-
-        filename_offset = stream.read_u32()
-        command_count = stream.read_u32()
-        node_count = stream.read_u32()
-        event_count = stream.read_u32()
-        partial_count = stream.read_u32()
-        sync_control_count = stream.read_u32()
-        blackboard_offset = stream.read_u32()
-        string_pool_offset = stream.read_u32()
-        
-        pos = stream.tell()
-        stream.seek(string_pool_offset)
-        string_pool = ReadStream(stream.read())
-        stream.seek(pos)
+    @classmethod
+    # data can also be a file path, including virtual paths into archives (Pack/Actor/X.pack.zs::AS/Foo.root.asb)
+    # lazy=True returns a LazyASB that only decodes what's accessed
+    # typed=True stores commands and nodes as slotted records (see model.py) instead of dicts, asdict() still returns plain dicts
+    def from_binary(cls, data, romfs_path="", lazy=False, typed=False):
+        if lazy:
+            return LazyASB.from_binary(data, romfs_path)
+        stream, string_pool, header = cls.open_binary(data, romfs_path)
         this = cls(None, stream, string_pool)
-        this.filename = this.string_pool.read_string(filename_offset)
-        this.version = version
-
-        enum_resolve_offset = this.stream.read_u32() # section is identical to AINB and also unused so I won't bother
-        state_transition_offset = this.stream.read_u32()
-        event_offsets_offset = this.stream.read_u32()
-        partials_offset = this.stream.read_u32()
-        sync_control_offset = this.stream.read_u32()
-        sync_control_indices_offset = this.stream.read_u32()
-        calc_controller_offset = this.stream.read_u32()
-        # this count doesn't line up...
-        # might be because some controllers calculate the same value but idk how to tell
-        calc_controller_count = this.stream.read_u32()
-        bone_groups_offset = this.stream.read_u32()
-        bone_group_count = this.stream.read_u32()
-        string_pool_size = this.stream.read_u32()
-        transitions_offset = this.stream.read_u32()
-        valid_tags_offset = this.stream.read_u32()
-        as_markings_offset = this.stream.read_u32()
-        expression_offset = this.stream.read_u32()
-        command_groups_offset = this.stream.read_u32()
-        material_blend_offset = this.stream.read_u32()
-        assert this.stream.tell() == 0x6C, f"Invalid header size {this.stream.tell()}, should be 0x6C"
-
-        commands_offset = this.stream.tell()
-
-        this.stream.seek(blackboard_offset)
-        this.blackboard = Blackboard(this.stream, this.string_pool).blackboard
-
-        if expression_offset != 0:
-            this.stream.seek(expression_offset)
-            this.expressions = EXB(this.stream.read()).exb_section
-        
-        this.stream.seek(calc_controller_offset)
-        while this.stream.tell() < valid_tags_offset:
-            this.calc_ctrl.append(this.read_calc_ctrl())
+        this.header = header
+        this.filename = this.string_pool.read_string(header.filename_offset)
+        this.version = header.version
+        for name in section_order:
+            setattr(this, name, section_readers[name](this))
+        this.nodes = [this.read_node(record, header.sync_control_indices_offset, i) for i, record in enumerate(this.read_node_headers())]
+        if typed:
+            this.to_typed()
+        return this
 
-        this.stream.seek(commands_offset)
-        for i in range(command_count):
-            this.commands.append(this.read_command())
+    # Converts commands and nodes to the typed model in place, calc controllers/sync controls shared between nodes stay shared
+    # The section lists built while parsing hold the old dicts so they're dropped, to_bytes() rebuilds them from the records
+    def to_typed(self):
+        memo = {}
+        self.commands = [model.to_command(command, memo) for command in self.commands]
+        self.nodes = [model.to_node(node, memo) for node in self.nodes]
+        self.calc_ctrl = []
+        self.events = []
+        self.sync_ctrl = []
+        self.as_markings = []
+        self.state_transitions = []
+        self.material_blend = []
+        self.typed = True
+
+    # Section readers, each one seeks to its own section
+    def read_blackboard_section(self):
+        self.stream.seek(self.header.blackboard_offset)
+        return Blackboard(self.stream, self.string_pool).blackboard
+
+    def read_expressions_section(self):
+        if self.header.expression_offset == 0:
+            return []
+        self.stream.seek(self.header.expression_offset)
+        return EXB(self.stream.read()).exb_section
+
+    def read_calc_ctrl_section(self):
+        self.stream.seek(self.header.calc_controller_offset)
+        # the calc controller count in the header doesn't line up so the size of the section is used instead
+        count = max(self.header.valid_tags_offset - self.header.calc_controller_offset + 0x1F, 0) // 0x20
+        return [self.read_calc_ctrl(record) for record in self.stream.iter_records(calc_ctrl_format, count)]
+
+    def read_commands_section(self):
+        self.stream.seek(header_size)
+        commands = [self.read_command(record) for record in self.stream.iter_records(command_format, self.header.command_count)]
+        assert self.stream.tell() == self.node_offset, f"Error reading commands"
+        return commands
+
+    def read_events_section(self):
+        self.stream.seek(self.header.event_offsets_offset)
+        return [self.read_event() for i in range(self.header.event_count)]
+
+    def read_sync_ctrl_section(self):
+        self.stream.seek(self.header.sync_control_offset)
+        return [self.read_sync_control() for i in range(self.header.sync_control_count)]
+
+    def read_bone_groups_section(self):
+        self.stream.seek(self.header.bone_groups_offset)
+        return [self.read_bone_group() for i in range(self.header.bone_group_count)]
+
+    def read_command_groups_section(self):
+        if self.header.command_groups_offset == 0:
+            return []
+        self.stream.seek(self.header.command_groups_offset)
+        return [self.read_command_group() for i in range(self.stream.read_u32())]
+
+    def read_transitions_section(self):
+        self.stream.seek(self.header.transitions_offset)
+        count = self.stream.read_u32()
+        self.stream.read(4) # usually 0 idk what it's for
+        return [self.read_transition_group() for i in range(count)]
 
-        node_offset = this.stream.tell()
-        assert node_offset == 0x6C + command_count * 0x30, f"Error reading commands"
+    def read_valid_tags_section(self):
+        self.stream.seek(self.header.valid_tags_offset)
+        return [self.string_pool.read_string(self.stream.read_u32()) for i in range(self.stream.read_u32())]
 
-        this.stream.seek(event_offsets_offset)
-        for i in range(event_count):
-            this.events.append(this.read_event())
+    def read_partials_section(self):
+        self.stream.seek(self.header.partials_offset)
+        return [self.read_partial() for i in range(self.header.partial_count)]
 
-        this.stream.seek(sync_control_offset)
-        for i in range(sync_control_count):
-            this.sync_ctrl.append(this.read_sync_control())
+    def read_as_markings_section(self):
+        self.stream.seek(self.header.as_markings_offset)
+        return [self.read_as_marking() for i in range(self.stream.read_u32())]
 
-        this.stream.seek(bone_groups_offset)
-        for i in range(bone_group_count):
-            this.bone_groups.append(this.read_bone_group())
-        
-        if command_groups_offset != 0:
-            this.stream.seek(command_groups_offset)
-            for i in range(this.stream.read_u32()):
-                this.command_groups.append(this.read_command_group())
-        
-        this.stream.seek(transitions_offset)
-        count = this.stream.read_u32()
-        stream.read(4) # usually 0 idk what it's for
-        for i in range(count):
-            this.transitions.append(this.read_transition_group())
-        
-        this.stream.seek(valid_tags_offset)
-        for i in range(this.stream.read_u32()):
-            this.valid_tags.append(this.string_pool.read_string(this.stream.read_u32()))
-        
-        this.stream.seek(partials_offset)
-        for i in range(partial_count):
-            this.partials.append(this.read_partial())
-        
-        this.stream.seek(as_markings_offset)
-        for i in range(this.stream.read_u32()):
-            this.as_markings.append(this.read_as_marking())
-        
-        this.stream.seek(material_blend_offset)
-        for i in range(this.stream.read_u32()):
-            this.material_blend.append(this.read_material_blend())
-        
-        this.stream.seek(state_transition_offset)
-        for i in range(this.stream.read_u32()):
-            this.state_transitions.append(this.read_state_transition())
+    def read_material_blend_section(self):
+        self.stream.seek(self.header.material_blend_offset)
+        return [self.read_material_blend() for i in range(self.stream.read_u32())]
 
-        this.stream.seek(node_offset)
-        for i in range(node_count):
-            this.nodes.append(this.read_node(sync_control_indices_offset))
+    def read_state_transitions_section(self):
+        self.stream.seek(self.header.state_transition_offset)
+        return [self.read_state_transition() for i in range(self.stream.read_u32())]
 
-        return this
+    # Node headers directly follow the commands
+    @property
+    def node_offset(self):
+        return header_size + self.header.command_count * get_struct(command_format).size
+
+    def read_node_headers(self):
+        self.stream.seek(self.node_offset)
+        return self.stream.iter_records(node_header_format, self.header.node_count)
+
+    def node(self, index):
+        return self.nodes[index]
+
+    # type is a node type name (e.g. "SkeletalAnimation") or NodeType, None yields every node
+    def iter_nodes(self, type=None):
+        if isinstance(type, NodeType):
+            type = type.name
+        for node in self.nodes:
+            if type is None or node["Node Type"] == type:
+                yield node
 
     @classmethod
     def from_dict(cls, data):
@@ -353,41 +430,41 @@ class ASB:
             "Partials" : self.partials,
             "Transitions" : self.transitions,
             "Valid Tags" : self.valid_tags,
-            "Commands" : self.commands,
-            "Nodes" : self.nodes
+            "Commands" : model.to_dict(self.commands) if self.typed else self.commands,
+            "Nodes" : model.to_dict(self.nodes) if self.typed else self.nodes
         }
 
-    def read_calc_ctrl(self):
+    def read_calc_ctrl(self, record):
         controller = {}
-        index = self.stream.read_s32()
+        index, adjust_value, calc_mode, default_value, adjust_rate, base_result, min, max = record
         if index < 0:
             controller["Parameter"] = {"Command Data Type": index & 0xFFFF}
         else:
             controller["Parameter"] = {"Blackboard Index": index & 0xFFFF, "Type": "float"}
-        controller["Adjust Value"] = self.stream.read_f32()
-        controller["Calc Mode"] = Mode(self.stream.read_u32()).name
-        controller["Default Value"] = self.stream.read_f32()
-        controller["Adjust Rate"] = self.stream.read_f32()
-        controller["Base Result"] = self.stream.read_f32()
-        controller["Min"] = self.stream.read_f32()
-        controller["Max"] = self.stream.read_f32()
+        controller["Adjust Value"] = adjust_value
+        controller["Calc Mode"] = Mode(calc_mode).name
+        controller["Default Value"] = default_value
+        controller["Adjust Rate"] = adjust_rate
+        controller["Base Result"] = base_result
+        controller["Min"] = min
+        controller["Max"] = max
         return controller
 
-    # very fun
     def parse_param(self, type, get_select_flag=False):
-        flags = self.stream.read_s32()
+        if type not in param_formats:
+            raise ValueError(f"Invalid parameter type: {type}")
+        record = self.stream.read_record(param_formats[type])
+        if type == "vec3f":
+            return self.decode_param(type, record[0], list(record[1:]))
+        return self.decode_param(type, record[0], record[1])
+
+    # very fun
+    # value is the raw slot value (string offset, s32, f32, u32 bool or list of three f32s)
+    def decode_param(self, type, flags, value):
         if type == "string":
-            value = self.string_pool.read_string(self.stream.read_u32())
-        elif type == "int":
-            value = self.stream.read_s32()
-        elif type == "float":
-            value = self.stream.read_f32()
+            value = self.string_pool.read_string(value)
         elif type == "bool":
-            value = bool(self.stream.read_u32())
-        elif type == "vec3f":
-            value = [self.stream.read_f32(), self.stream.read_f32(), self.stream.read_f32()]
-        else:
-            raise ValueError(f"Invalid parameter type: {type}")
+            value = bool(value)
         if flags < 0:
             orig = value
             flags = flags & 0xFFFFFFFF
@@ -424,11 +501,11 @@ class ASB:
 
     # needs to be formatted as %08x-%04x-%04x-%02x%02x-%02x%02x%02x%02x%02x%02x for baev hash calculations
     def read_guid(self):
-        return "%08x-%04x-%04x-%02x%02x-%02x%02x%02x%02x%02x%02x" \
-            % (self.stream.read_u32(), self.stream.read_u16(), self.stream.read_u16(),
-               self.stream.read_u8(), self.stream.read_u8(),
-               self.stream.read_u8(), self.stream.read_u8(), self.stream.read_u8(),
-               self.stream.read_u8(), self.stream.read_u8(), self.stream.read_u8())
+        return self.format_guid(self.stream.read(16))
+
+    @staticmethod
+    def format_guid(data):
+        return guid_format % get_struct("<IHH8B").unpack(data)
 
     def read_tag_group(self):
         count = self.stream.read_u32()
@@ -437,21 +514,21 @@ class ASB:
             tags.append(self.string_pool.read_string(self.stream.read_u32()))
         return tags
 
-    def read_command(self):
+    # the trailing u16 is a second node index in AINB but I haven't seen it ever used and it's always 0 so might be padding
+    def read_command(self, record):
         command = {}
-        command["Name"] = self.string_pool.read_string(self.stream.read_u32())
-        tag_offset = self.stream.read_u32()
+        name_offset, tag_offset, unk_flags, unk, ignore_flags, ignore, interpolation, guid, node_index = record
+        command["Name"] = self.string_pool.read_string(name_offset)
         if tag_offset != 0:
             pos = self.stream.tell()
             self.stream.seek(tag_offset)
             command["Tags"] = self.read_tag_group()
             self.stream.seek(pos)
-        command["Unknown 1"] = self.parse_param("float")
-        command["Ignore Same Command"] = self.parse_param("bool")
-        command["Interpolation Type"] = self.stream.read_u32()
-        command["GUID"] = self.read_guid()
-        command["Node Index"] = self.stream.read_u16()
-        self.stream.read(2) # a second node index in AINB but I haven't seen it ever used and it's always 0 so might be padding
+        command["Unknown 1"] = self.decode_param("float", unk_flags, unk)
+        command["Ignore Same Command"] = self.decode_param("bool", ignore_flags, ignore)
+        command["Interpolation Type"] = interpolation
+        command["GUID"] = self.format_guid(guid)
+        command["Node Index"] = node_index
         return command
     
     def read_event_param(self):
@@ -670,25 +747,20 @@ class ASB:
             partial["Bones"].append(bone)
         return partial
     
-    def read_node(self, sync_offset):
+    def read_node(self, record, sync_offset, index):
         node = {}
-        node["Node Index"] = len(self.nodes)
-        node["Node Type"] = NodeType(self.stream.read_u16()).name
-        sync_count = self.stream.read_u8()
-        node["No State Transition"] = bool(self.stream.read_u8())
-        tag_offset = self.stream.read_u32()
+        node_type, sync_count, no_transition, tag_offset, body_offset, \
+            calc_ctrl_index, calc_ctrl_count, sync_index, as_marking_index, guid = record
+        if node_type not in node_registry:
+            raise ValueError(f"{node_type} is not a valid NodeType")
+        node["Node Index"] = index
+        node["Node Type"] = node_type_names[node_type]
+        node["No State Transition"] = bool(no_transition)
         if tag_offset != 0:
-            pos = self.stream.tell()
             self.stream.seek(tag_offset)
             node["Tags"] = self.read_tag_group()
-            self.stream.seek(pos)
-        body_offset = self.stream.read_u32()
-        calc_ctrl_index = self.stream.read_u16()
-        calc_ctrl_count = self.stream.read_u16()
-        sync_index = self.stream.read_u16()
-        as_marking_index = self.stream.read_u16() - 1
-        node["GUID"] = self.read_guid()
-        pos = self.stream.tell()
+        as_marking_index -= 1
+        node["GUID"] = self.format_guid(guid)
         if as_marking_index >= 0:
             node["ASMarking"] = self.as_markings[as_marking_index]
         if sync_count > 0:
@@ -699,57 +771,9 @@ class ASB:
         if calc_ctrl_count > 0:
             node["Calc Controllers"] = self.calc_ctrl[calc_ctrl_index : calc_ctrl_index + calc_ctrl_count]
         self.stream.seek(body_offset)
-        if node["Node Type"] == "FloatSelector":
-            node["Body"] = self.FloatSelector()
-        elif node["Node Type"] == "StringSelector":
-            node["Body"] = self.StringSelector()
-        elif node["Node Type"] == "SkeletalAnimation":
-            node["Body"] = self.SkeletalAnimation()
-        elif node["Node Type"] == "State":
-            node["Body"] = self.State()
-        elif node["Node Type"] == "Unknown2":
-            pass # No node body
-        elif node["Node Type"] == "OneDimensionalBlender":
-            node["Body"] = self.OneDimensionalBlender()
-        elif node["Node Type"] == "Sequential":
-            node["Body"] = self.Sequential()
-        elif node["Node Type"] == "IntSelector":
-            node["Body"] = self.IntSelector()
-        elif node["Node Type"] == "Simultaneous":
-            node["Body"] = self.Simultaneous()
-        elif node["Node Type"] == "Event":
-            node["Body"] = self.EventNode()
-        elif node["Node Type"] == "MaterialAnimation":
-            node["Body"] = self.MaterialAnimation()
-        elif node["Node Type"] == "FrameController":
-            node["Body"] = self.FrameController()
-        elif node["Node Type"] == "DummyAnimation":
-            node["Body"] = self.DummyAnimation()
-        elif node["Node Type"] == "RandomSelector":
-            node["Body"] = self.RandomSelector()
-        elif node["Node Type"] == "Unknown4":
-            pass # No node body
-        elif node["Node Type"] == "PreviousTagSelector":
-            node["Body"] = self.PreviousTagSelector()
-        elif node["Node Type"] == "BonePositionSelector":
-            node["Body"] = self.BonePositionSelector()
-        elif node["Node Type"] == "BoneAnimation":
-            node["Body"] = self.BoneAnimation()
-        elif node["Node Type"] == "InitialFrame":
-            node["Body"] = self.InitialFrame()
-        elif node["Node Type"] == "BoneBlender":
-            node["Body"] = self.BoneBlender()
-        elif node["Node Type"] == "BoolSelector":
-            node["Body"] = self.BoolSelector()
-        elif node["Node Type"] == "Alert":
-            node["Body"] = self.Alert()
-        elif node["Node Type"] == "SubtractAnimation":
-            node["Body"] = self.SubtractAnimation()
-        elif node["Node Type"] == "ShapeAnimation":
-            node["Body"] = self.ShapeAnimation()
-        elif node["Node Type"] == "Unknown7":
-            node["Body"] = self.Unknown7()
-        self.stream.seek(pos)
+        reader = node_registry[node_type].reader
+        if reader is not None:
+            node["Body"] = reader(self)
         return node
     
     def read_connections(self):
@@ -1404,23 +1428,26 @@ class ASB:
         self.has_asnode_baev = True
 
     # what fun
+    def write_value(self, buffer, value):
+        if type(value) == int:
+            buffer.write(s32(value))
+        elif type(value) == float:
+            buffer.write(f32(value))
+        elif type(value) == str:
+            buffer.add_string(value)
+            buffer.write(u32(buffer._string_refs[value]))
+        elif type(value) == bool:
+            buffer.write(u32(1 if value else 0))
+        elif type(value) == list:
+            for v in value:
+                buffer.write(f32(v))
+        else:
+            raise ValueError(f"Invalid value {value}")
+
     def write_parameter(self, buffer, value):
         if type(value) != dict:
             buffer.write(u32(0))
-            if type(value) == int:
-                buffer.write(s32(value))
-            elif type(value) == float:
-                buffer.write(f32(value))
-            elif type(value) == str:
-                buffer.add_string(value)
-                buffer.write(u32(buffer._string_refs[value]))
-            elif type(value) == bool:
-                buffer.write(u32(1 if value else 0))
-            elif type(value) == list:
-                for v in value:
-                    buffer.write(f32(v))
-            else:
-                raise ValueError(f"Invalid value {value}")
+            self.write_value(buffer, value)
         else:
             flag = 1 << 0x1F
             if "Expression Index" in value:
@@ -1450,44 +1477,39 @@ class ASB:
                 flag |= SelectFlag[value["Select Flag"]].value << 0x1C
             buffer.write(u32(flag))
             if "Input" in value:
-                if type(value["Input"]) == int:
-                    buffer.write(s32(value["Input"]))
-                elif type(value["Input"]) == float:
-                    buffer.write(f32(value["Input"]))
-                elif type(value["Input"]) == str:
-                    buffer.add_string(value["Input"])
-                    buffer.write(u32(buffer._string_refs[value["Input"]]))
-                elif type(value["Input"]) == bool:
-                    buffer.write(u32(1 if value["Input"] else 0))
-                elif type(value["Input"]) == list:
-                    for v in value["Input"]:
-                        buffer.write(f32(v))
-                else:
-                    raise ValueError(f"Invalid value {value['Input']}")
+                self.write_value(buffer, value["Input"])
             elif "Default Value" in value and "Calc Mode" not in value:
-                if type(value["Default Value"]) == int:
-                    buffer.write(s32(value["Default Value"]))
-                elif type(value["Default Value"]) == float:
-                    buffer.write(f32(value["Default Value"]))
-                elif type(value["Default Value"]) == str:
-                    buffer.add_string(value["Default Value"])
-                    buffer.write(u32(buffer._string_refs[value["Default Value"]]))
-                elif type(value["Default Value"]) == bool:
-                    buffer.write(u32(1 if value["Default Value"] else 0))
-                elif type(value["Default Value"]) == list:
-                    for v in value["Default Value"]:
-                        buffer.write(f32(v))
-                else:
-                    raise ValueError(f"Invalid value {value['Default Value']}")
+                self.write_value(buffer, value["Default Value"])
             else:
                 buffer.write(u32(0))
 
-    def to_json(self, output_dir=""):
+    # compact=True writes the JSON without indentation (using orjson/msgspec if installed)
+    def to_json(self, output_dir="", compact=False):
         if output_dir:
             os.makedirs(output_dir, exist_ok=True)
-        with open(os.path.join(output_dir, self.filename + ".json"), "w", encoding="utf-8") as f:
-            json.dump(self.asdict(), f, indent=4, ensure_ascii=False)
+        jsonio.write_json(self.asdict(), os.path.join(output_dir, self.filename + ".json"), compact)
     
+    # Same data as the JSON in a binary form that's much faster to save and load, meant for passing files between tools
+    # rather than editing (use the JSON for that)
+    # marshal doesn't guard against malformed data so only load caches written by this tool, not files from elsewhere
+    def to_cache(self):
+        return get_struct(cache_header_format).pack(cache_magic, cache_version) + marshal.dumps(self.asdict(), cache_marshal_version)
+
+    @classmethod
+    # data can also be a file path
+    def from_cache(cls, data):
+        if isinstance(data, (str, os.PathLike)):
+            with open(data, "rb") as f:
+                data = f.read()
+        header = get_struct(cache_header_format)
+        assert len(data) >= header.size, "Cache is too small to contain a header"
+        magic, version = header.unpack_from(data)
+        assert magic == cache_magic, f"Invalid file magic '{magic.decode('utf-8', 'replace')}', expected '{cache_magic.decode('utf-8')}'"
+        assert version == cache_version, f"Unsupported cache version {version}, expected {cache_version}"
+        data = marshal.loads(memoryview(data)[header.size:])
+        assert type(data) == dict, "Cache does not contain an ASB file"
+        return cls.from_dict(data)
+
      # Let's just do this all now so we don't have to jump back and fill in the offsets later
     def calc_offsets(self, body_sizes, event_count, sync_count, tag_groups, buffer):
         offsets = {}
@@ -1536,7 +1558,7 @@ class ASB:
             offsets["Command Groups"] = 0
         offsets["Blackboard"] = offset
         offset += 0x30
-        refs = []
+        refs = set()
         for datatype in self.blackboard:
             offset += 0x4 * len(self.blackboard[datatype])
             if datatype in ["int", "float", "bool", "string"]:
@@ -1545,8 +1567,7 @@ class ASB:
                 offset += 0xc * len(self.blackboard[datatype])
             for param in self.blackboard[datatype]:
                 if "Reference File" in param:
-                    if param["Reference File"] not in refs:
-                        refs.append(param["Reference File"])
+                    refs.add(param["Reference File"])
         offset += 0x10 * len(refs)
         offsets["Partials"] = offset
         for entry in self.partials:
@@ -1582,56 +1603,8 @@ class ASB:
     
     @staticmethod
     def calc_body_size(node, version):
-        if node["Node Type"] == "FloatSelector":
-            size = 0x20
-        elif node["Node Type"] == "StringSelector":
-            size = 0x20
-        elif node["Node Type"] == "SkeletalAnimation":
-            size = 0x2c
-        elif node["Node Type"] == "State":
-            size = 0xc
-        elif node["Node Type"] == "Unknown2":
-            size = 0x0
-        elif node["Node Type"] == "OneDimensionalBlender":
-            size = 0x18
-        elif node["Node Type"] == "Sequential":
-            size = 0x24
-        elif node["Node Type"] == "IntSelector":
-            size = 0x20
-        elif node["Node Type"] == "Simultaneous":
-            size = 0x10
-        elif node["Node Type"] == "Event":
-            size = 0x10
-        elif node["Node Type"] == "MaterialAnimation":
-            size = 0x20
-        elif node["Node Type"] == "FrameController":
-            size = 0x84
-        elif node["Node Type"] == "DummyAnimation":
-            size = 0x1c
-        elif node["Node Type"] == "RandomSelector":
-            size = 0x24
-        elif node["Node Type"] == "Unknown4":
-            size = 0x0
-        elif node["Node Type"] == "PreviousTagSelector":
-            size = 0x10
-        elif node["Node Type"] == "BonePositionSelector":
-            size = 0x2c
-        elif node["Node Type"] == "BoneAnimation":
-            size = 0x2c
-        elif node["Node Type"] == "InitialFrame":
-            size = 0x40
-        elif node["Node Type"] == "BoneBlender":
-            size = 0x28
-        elif node["Node Type"] == "BoolSelector":
-            size = 0x20
-        elif node["Node Type"] == "Alert":
-            size = 0x14
-        elif node["Node Type"] == "SubtractAnimation":
-            size = 0xc
-        elif node["Node Type"] == "ShapeAnimation":
-            size = 0x14
-        elif node["Node Type"] == "Unknown7":
-            size = 0xc
+        node_info = node_registry[node_type_values[node["Node Type"]]]
+        size = node_info.size
         if "Body" in node:
             if "State Connections" in node["Body"]:
                 size += 8 * len(node["Body"]["State Connections"]) # 4 for the offset and 4 for the index
@@ -1645,14 +1618,7 @@ class ASB:
             if "Frame Controls" in node["Body"]:
                 size += 8 * len(node["Body"]["Frame Controls"]) # 4 for the offset and 4 for the index
             if "Child Nodes" in node["Body"]:
-                if node["Node Type"] in ["BonePositionSelector", "FloatSelector", "OneDimensionalBlender"]:
-                    size += 24 * len(node["Body"]["Child Nodes"]) # 4 for the offset and 16 for the two conditions and 4 for the index
-                elif node["Node Type"] in ["RandomSelector", "IntSelector", "StringSelector"]:
-                    size += 16 * len(node["Body"]["Child Nodes"]) # 4 for the offset and 8 for the condition and 4 for the index
-                elif node["Node Type"] == "PreviousTagSelector":
-                    size += 12 * len(node["Body"]["Child Nodes"]) # 4 for the offset, 4 for the tag offset, 4 for the index
-                else:
-                    size += 8 * len(node["Body"]["Child Nodes"]) # 4 for the offset and 4 for the index
+                size += (4 + node_info.child_size) * len(node["Body"]["Child Nodes"]) # 4 for the offset + the child entry
         return size
 
     def write_connections(self, buffer, node_body, node_type, tag_map={}):
@@ -1705,16 +1671,10 @@ class ASB:
                 buffer.write(u32(offset))
                 offset += 4
         if "Child Nodes" in node_body:
+            child_size = node_registry[node_type_values[node_type]].child_size
             for entry in node_body["Child Nodes"]:
                 buffer.write(u32(offset))
-                if node_type in ["BonePositionSelector", "FloatSelector", "OneDimensionalBlender"]:
-                    offset += 20
-                elif node_type in ["RandomSelector", "IntSelector", "StringSelector"]:
-                    offset += 12
-                elif node_type == "PreviousTagSelector":
-                    offset += 8
-                else:
-                    offset += 4
+                offset += child_size
         if "State Transitions" in node_body:
             for entry in node_body["State Transitions"]:
                 buffer.write(u32(offset))
@@ -1766,7 +1726,7 @@ class ASB:
         if "State Transitions" in node_body:
             for entry in node_body["State Transitions"]:
                 if entry["State Transition"]:
-                    buffer.write(u32(self.state_transitions.index(entry["State Transition"])))
+                    buffer.write(u32(self.state_transition_indices[freeze(entry["State Transition"])]))
                 else:
                     buffer.write(s32(-1))
                 buffer.write(u32(entry["Node Index"]))
@@ -1777,6 +1737,157 @@ class ASB:
             for entry in node_body["Frame Controls"]:
                 buffer.write(u32(entry))
 
+    def write_float_selector(self, buffer, body, tag_map):
+        self.write_parameter(buffer, body["Parameter"])
+        self.write_parameter(buffer, body["Is Sync"])
+        buffer.write(u32(1 if body["Force Run"] else 0))
+        self.write_connections(buffer, body, "FloatSelector")
+
+    def write_string_selector(self, buffer, body, tag_map):
+        self.write_parameter(buffer, body["Parameter"])
+        self.write_parameter(buffer, body["Is Sync"])
+        buffer.write(u32(1 if body["Force Run"] else 0))
+        self.write_connections(buffer, body, "StringSelector")
+
+    def write_skeletal_animation(self, buffer, body, tag_map):
+        self.write_parameter(buffer, body["Animation"])
+        buffer.write(u32(body["Unknown 1"]))
+        buffer.write(u32(body["Unknown 2"]))
+        self.write_parameter(buffer, body["Unknown 3"])
+        self.write_parameter(buffer, body["Unknown 4"])
+        self.write_connections(buffer, body, "SkeletalAnimation")
+
+    def write_state(self, buffer, body, tag_map):
+        self.write_connections(buffer, body, "State")
+
+    def write_one_dimensional_blender(self, buffer, body, tag_map):
+        self.write_parameter(buffer, body["Parameter"])
+        buffer.write(u32(body["Lerp Mode"]))
+        self.write_connections(buffer, body, "OneDimensionalBlender")
+
+    def write_sequential(self, buffer, body, tag_map):
+        self.write_parameter(buffer, body["Use Sync Range Mult"])
+        self.write_parameter(buffer, body["Sync Range Mult"])
+        self.write_parameter(buffer, body["Unknown 3"])
+        self.write_connections(buffer, body, "Sequential")
+
+    def write_int_selector(self, buffer, body, tag_map):
+        self.write_parameter(buffer, body["Parameter"])
+        self.write_parameter(buffer, body["Is Sync"])
+        buffer.write(u32(1 if body["Force Run"] else 0))
+        self.write_connections(buffer, body, "IntSelector")
+
+    def write_simultaneous(self, buffer, body, tag_map):
+        buffer.write(u32(body["Finish With Child"]))
+        self.write_connections(buffer, body, "Simultaneous")
+
+    def write_event_node(self, buffer, body, tag_map):
+        buffer.write(u32(self.current_event_index))
+        self.current_event_index += 1
+        self.write_connections(buffer, body, "Event")
+
+    def write_material_animation(self, buffer, body, tag_map):
+        if "Material Blend Setting" in body:
+            buffer.write(u32(self.material_blend_indices[freeze(body["Material Blend Setting"])] + 1))
+        else:
+            buffer.write(u32(0))
+        self.write_parameter(buffer, body["Animation"])
+        self.write_parameter(buffer, body["Is Loop"])
+        self.write_connections(buffer, body, "MaterialAnimation")
+
+    def write_frame_controller(self, buffer, body, tag_map):
+        self.write_parameter(buffer, body["Animation Rate"])
+        self.write_parameter(buffer, body["Start Frame"])
+        self.write_parameter(buffer, body["End Frame"])
+        buffer.write(u32(body["Loop Flags"]))
+        self.write_parameter(buffer, body["Loop Cancel Flag"])
+        self.write_parameter(buffer, body["Unknown 2"])
+        self.write_parameter(buffer, body["Loop Num"])
+        self.write_parameter(buffer, body["Max Random Loop Num"])
+        self.write_parameter(buffer, body["Is Not Use Random Bonus Loop"])
+        self.write_parameter(buffer, body["Animation Freeze Point"])
+        self.write_parameter(buffer, body["Animation Freeze Frame"])
+        self.write_parameter(buffer, body["Loop Duration"])
+        buffer.write(u32(1 if body["Is Include Initial Loop"] else 0))
+        self.write_parameter(buffer, body["Unknown 10"])
+        self.write_parameter(buffer, body["Unknown 11"])
+        buffer.write(u32(body["Unknown 12"]))
+        buffer.write(u32(body["Unknown 13"]))
+        self.write_connections(buffer, body, "FrameController")
+
+    def write_dummy_animation(self, buffer, body, tag_map):
+        self.write_parameter(buffer, body["Frame"])
+        self.write_parameter(buffer, body["Is Loop"])
+        self.write_connections(buffer, body, "DummyAnimation")
+
+    def write_random_selector(self, buffer, body, tag_map):
+        buffer.write(u32(SelectFlag[body["Select Flag"]].value))
+        self.write_parameter(buffer, body["Is Sync"])
+        self.write_parameter(buffer, body["Max Cached Select Count"])
+        buffer.write(u32(1 if body["Force Run"] else 0))
+        self.write_connections(buffer, body, "RandomSelector")
+
+    def write_previous_tag_selector(self, buffer, body, tag_map):
+        buffer.write(u32(body["Tag Set Index"]))
+        self.write_connections(buffer, body, "PreviousTagSelector", tag_map)
+
+    def write_bone_position_selector(self, buffer, body, tag_map):
+        self.write_parameter(buffer, body["Bone 1"])
+        self.write_parameter(buffer, body["Bone 2"])
+        buffer.write(u32(Axis[body["Axis"]].value))
+        buffer.write(u32(SelectFlag[body["Select Flag"]].value))
+        self.write_parameter(buffer, body["Is Sync"])
+        self.write_connections(buffer, body, "BonePositionSelector")
+
+    def write_bone_animation(self, buffer, body, tag_map):
+        self.write_parameter(buffer, body["Animation"])
+        self.write_parameter(buffer, body["Is Loop"])
+        self.write_parameter(buffer, body["Unknown 2"])
+        self.write_parameter(buffer, body["Unknown 3"])
+        self.write_connections(buffer, body, "BoneAnimation")
+
+    def write_initial_frame(self, buffer, body, tag_map):
+        buffer.write(u32(InitialFrameCalcMode[body["Calc Mode"]].value))
+        if "Tags" in body:
+            buffer.write(u32(tag_map[tuple(body["Tags"])]))
+        else:
+            buffer.write(u32(0))
+        self.write_parameter(buffer, body["Unknown 1"])
+        self.write_parameter(buffer, body["Bone 1"])
+        self.write_parameter(buffer, body["Bone 2"])
+        buffer.write(u32(Axis[body["Axis"]].value))
+        self.write_parameter(buffer, body["Calc Loop"])
+        self.write_parameter(buffer, body["Exclude Random Loops"])
+        self.write_connections(buffer, body, "InitialFrame")
+
+    def write_bone_blender(self, buffer, body, tag_map):
+        self.write_parameter(buffer, body["Bone Group Name"])
+        buffer.write(u32(body["Unknown 1"]))
+        self.write_parameter(buffer, body["Blend Rate"])
+        buffer.write(u32(body["Unknown 3"]))
+        buffer.write(u32(body["Unknown 4"]))
+        self.write_connections(buffer, body, "BoneBlender")
+
+    def write_bool_selector(self, buffer, body, tag_map):
+        self.write_parameter(buffer, body["Parameter"])
+        self.write_parameter(buffer, body["Is Sync"])
+        buffer.write(u32(1 if body["Force Run"] else 0))
+        self.write_connections(buffer, body, "BoolSelector")
+
+    def write_alert(self, buffer, body, tag_map):
+        self.write_parameter(buffer, body["Message"])
+        self.write_connections(buffer, body, "Alert")
+
+    def write_subtract_animation(self, buffer, body, tag_map):
+        self.write_connections(buffer, body, "SubtractAnimation")
+
+    def write_shape_animation(self, buffer, body, tag_map):
+        self.write_parameter(buffer, body["Animation"])
+        self.write_connections(buffer, body, "ShapeAnimation")
+
+    def write_unknown7(self, buffer, body, tag_map):
+        self.write_connections(buffer, body, "Unknown7")
+
     @staticmethod
     def write_guid(buffer: WriteStream, guid):
         parts = guid.split("-")
@@ -1792,577 +1903,614 @@ class ASB:
         buffer.write(u8(int(parts[4][8:10], 16)))
         buffer.write(u8(int(parts[4][10:12], 16)))
 
-    def to_binary(self, output_dir=""):
-        if output_dir:
-            os.makedirs(output_dir, exist_ok=True)
+    # Serializes the file into an in-memory buffer
+    def to_bytes(self):
+        # the writer works on dicts, typed files are written from their dict form so edits to any record are picked up
+        if self.typed:
+            return ASB.from_dict(self.asdict()).to_bytes()
         self.current_calc_index = 0
-        with open(os.path.join(output_dir, self.filename + ".asb"), "wb") as f:
-            buffer = WriteStream(f)
-            buffer.write("ASB ".encode())
-            buffer.write(u32(self.version))
-            buffer.add_string(self.filename)
-            buffer.write(u32(buffer._string_refs[self.filename]))
-            buffer.write(u32(len(self.commands)))
-            buffer.write(u32(len(self.nodes)))
-            buffer.write(u32(len(self.events)))
-            buffer.write(u32(len(self.partials)))
-            buffer.write(u32(len(self.sync_ctrl)))
-            tag_groups = []
-            body_sizes = {}
-            for command in self.commands:
-                if "Tags" in command:
-                    if command["Tags"] not in tag_groups:
-                        tag_groups.append(command["Tags"])
-            event_count = 0
-            sync_count = 0
-            body_tags = []
-            sync_ctrl = []
-            for node in self.nodes:
-                if "Tags" in node:
-                    if node["Tags"] not in tag_groups:
-                        tag_groups.append(node["Tags"])
-                if "Sync Controls" in node:
-                    for entry in node["Sync Controls"]:
-                        sync_ctrl.append(entry)
-                    sync_count += len(node["Sync Controls"])
-                if node["Node Type"] == "PreviousTagSelector":
-                    for child in node["Body"]["Child Nodes"]:
-                        if child["Tags"] and child["Tags"] not in tag_groups:
-                            body_tags.append(child["Tags"])
-                if node["Node Type"] == "Event":
-                    event_count += 1
-                if node["Node Type"] == "InitialFrame":
-                    if "Tags" in node["Body"] and node["Body"]["Tags"] not in tag_groups:
-                        body_tags.append(node["Body"]["Tags"])
-                body_sizes[node["Node Index"]] = self.calc_body_size(node, self.version)
-            for tag in body_tags:
-                if tag not in tag_groups:
-                    tag_groups.append(tag)
-            offsets, tag_map, event_offsets = self.calc_offsets(body_sizes, event_count, sync_count, tag_groups, buffer)
-            buffer.write(u32(offsets["Blackboard"]))
-            buffer.write(u32(offsets["Strings"]))
-            buffer.write(u32(offsets["Enum"]))
-            buffer.write(u32(offsets["State Transitions"]))
-            buffer.write(u32(offsets["Event Offsets"]))
-            buffer.write(u32(offsets["Partials"]))
-            buffer.write(u32(offsets["Sync Control"]))
-            buffer.write(u32(offsets["Sync Indices"]))
-            buffer.write(u32(offsets["Calc Control"]))
-            buffer.write(u32(len(self.calc_ctrl)))
-            buffer.write(u32(offsets["Bone Groups"]))
-            buffer.write(u32(len(self.bone_groups)))
-            buffer.write(u32(0)) # string pool size to be written to later
-            buffer.write(u32(offsets["Transitions"]))
-            buffer.write(u32(offsets["Tag List"]))
-            buffer.write(u32(offsets["ASMarkings"]))
-            buffer.write(u32(offsets["EXB"]))
-            buffer.write(u32(offsets["Command Groups"]))
-            buffer.write(u32(offsets["Material Blend"]))
-            for command in self.commands:
-                buffer.add_string(command["Name"])
-                buffer.write(u32(buffer._string_refs[command["Name"]]))
-                if "Tags" in command:
-                    for tag in command["Tags"]:
-                        buffer.add_string(tag)
-                    buffer.write(u32(tag_map[tuple(command["Tags"])]))
-                else:
-                    buffer.write(u32(0))
-                self.write_parameter(buffer, command["Unknown 1"])
-                self.write_parameter(buffer, command["Ignore Same Command"])
-                buffer.write(u32(command["Interpolation Type"]))
-                self.write_guid(buffer, command["GUID"])
-                buffer.write(u16(command["Node Index"]))
+        stream = io.BytesIO()
+        buffer = WriteStream(stream)
+        buffer.write("ASB ".encode())
+        buffer.write(u32(self.version))
+        buffer.add_string(self.filename)
+        buffer.write(u32(buffer._string_refs[self.filename]))
+        buffer.write(u32(len(self.commands)))
+        buffer.write(u32(len(self.nodes)))
+        buffer.write(u32(len(self.events)))
+        buffer.write(u32(len(self.partials)))
+        buffer.write(u32(len(self.sync_ctrl)))
+        # Lookup tables for entries that are referenced by index
+        self.state_transition_indices = index_entries(self.state_transitions)
+        as_marking_indices = index_entries(self.as_markings)
+        self.material_blend_indices = index_entries(self.material_blend)
+        command_group_indices = index_entries(self.command_groups)
+        sync_ctrl_indices = index_entries(self.sync_ctrl)
+        tag_groups = []
+        seen_tags = set()
+        body_sizes = {}
+        for command in self.commands:
+            if "Tags" in command:
+                if tuple(command["Tags"]) not in seen_tags:
+                    seen_tags.add(tuple(command["Tags"]))
+                    tag_groups.append(command["Tags"])
+        event_count = 0
+        sync_count = 0
+        body_tags = []
+        sync_ctrl = []
+        for node in self.nodes:
+            if "Tags" in node:
+                if tuple(node["Tags"]) not in seen_tags:
+                    seen_tags.add(tuple(node["Tags"]))
+                    tag_groups.append(node["Tags"])
+            if "Sync Controls" in node:
+                for entry in node["Sync Controls"]:
+                    sync_ctrl.append(entry)
+                sync_count += len(node["Sync Controls"])
+            if node["Node Type"] == "PreviousTagSelector":
+                for child in node["Body"]["Child Nodes"]:
+                    if child["Tags"]:
+                        body_tags.append(child["Tags"])
+            if node["Node Type"] == "Event":
+                event_count += 1
+            if node["Node Type"] == "InitialFrame":
+                if "Tags" in node["Body"]:
+                    body_tags.append(node["Body"]["Tags"])
+            body_sizes[node["Node Index"]] = self.calc_body_size(node, self.version)
+        for tag in body_tags: # body tags go after all of the node tags
+            if tuple(tag) not in seen_tags:
+                seen_tags.add(tuple(tag))
+                tag_groups.append(tag)
+        offsets, tag_map, event_offsets = self.calc_offsets(body_sizes, event_count, sync_count, tag_groups, buffer)
+        buffer.write(u32(offsets["Blackboard"]))
+        buffer.write(u32(offsets["Strings"]))
+        buffer.write(u32(offsets["Enum"]))
+        buffer.write(u32(offsets["State Transitions"]))
+        buffer.write(u32(offsets["Event Offsets"]))
+        buffer.write(u32(offsets["Partials"]))
+        buffer.write(u32(offsets["Sync Control"]))
+        buffer.write(u32(offsets["Sync Indices"]))
+        buffer.write(u32(offsets["Calc Control"]))
+        buffer.write(u32(len(self.calc_ctrl)))
+        buffer.write(u32(offsets["Bone Groups"]))
+        buffer.write(u32(len(self.bone_groups)))
+        buffer.write(u32(0)) # string pool size to be written to later
+        buffer.write(u32(offsets["Transitions"]))
+        buffer.write(u32(offsets["Tag List"]))
+        buffer.write(u32(offsets["ASMarkings"]))
+        buffer.write(u32(offsets["EXB"]))
+        buffer.write(u32(offsets["Command Groups"]))
+        buffer.write(u32(offsets["Material Blend"]))
+        for command in self.commands:
+            buffer.add_string(command["Name"])
+            buffer.write(u32(buffer._string_refs[command["Name"]]))
+            if "Tags" in command:
+                for tag in command["Tags"]:
+                    buffer.add_string(tag)
+                buffer.write(u32(tag_map[tuple(command["Tags"])]))
+            else:
+                buffer.write(u32(0))
+            self.write_parameter(buffer, command["Unknown 1"])
+            self.write_parameter(buffer, command["Ignore Same Command"])
+            buffer.write(u32(command["Interpolation Type"]))
+            self.write_guid(buffer, command["GUID"])
+            buffer.write(u16(command["Node Index"]))
+            buffer.write(u16(0))
+        body_offset = offsets["Node Bodies"]
+        calc_index = 0
+        sync_index = 0
+        for node in self.nodes:
+            buffer.write(u16(node_type_values[node["Node Type"]]))
+            if "Sync Controls" in node:
+                buffer.write(u8(len(node["Sync Controls"])))
+            else:
+                buffer.write(u8(0))
+            buffer.write(u8(1 if node["No State Transition"] else 0))
+            if "Tags" in node:
+                for tag in node["Tags"]:
+                    buffer.add_string(tag)
+                buffer.write(u32(tag_map[tuple(node["Tags"])]))
+            else:
+                buffer.write(u32(0))
+            buffer.write(u32(body_offset))
+            body_offset += body_sizes[node["Node Index"]]
+            buffer.write(u16(calc_index))
+            if "Calc Controllers" in node:
+                calc_index += len(node["Calc Controllers"])
+                buffer.write(u16(len(node["Calc Controllers"])))
+            else:
                 buffer.write(u16(0))
-            body_offset = offsets["Node Bodies"]
-            calc_index = 0
-            sync_index = 0
-            for node in self.nodes:
-                buffer.write(u16(NodeType[node["Node Type"]].value))
-                if "Sync Controls" in node:
-                    buffer.write(u8(len(node["Sync Controls"])))
+            buffer.write(u16(sync_index))
+            if "Sync Controls" in node:
+                sync_index += len(node["Sync Controls"])
+            if "ASMarking" in node:
+                buffer.write(u16(as_marking_indices[freeze(node["ASMarking"])] + 1))
+            else:
+                buffer.write(u16(0))
+            self.write_guid(buffer, node["GUID"])
+        for offset in event_offsets:
+            buffer.write(u32(offset))
+        self.current_event_index = 0
+        for node in self.nodes:
+            if "Body" in node:
+                writer = node_registry[node_type_values[node["Node Type"]]].writer
+                if writer is None:
+                    raise ValueError(f"Invalid node type {node['Node Type']}")
+                writer(self, buffer, node["Body"], tag_map)
+        for entry in sync_ctrl:
+            buffer.write(u32(sync_ctrl_indices[freeze(entry)]))
+        value_offset = offsets["Sync Control"] + 0x18 * len(self.sync_ctrl)
+        for entry in self.sync_ctrl:
+            if "Fade In Frame" in entry:
+                type = 0
+            elif "Sync Start Frame" in entry:
+                type = 1
+            else:
+                type = 3
+            buffer.write(u32(type))
+            buffer.write(u32(value_offset))
+            if type == 0:
+                value_offset += 12
+            elif type == 1:
+                value_offset += 24
+            # Scuffed but works
+            self.write_guid(buffer, entry["GUID"])
+        for entry in self.sync_ctrl:
+            if "Fade In Frame" in entry:
+                self.write_parameter(buffer, entry["Fade In Frame"])
+                buffer.write(u32(entry["Unknown"]))
+            elif "Sync Start Frame" in entry:
+                self.write_parameter(buffer, entry["Sync Start Frame"])
+                self.write_parameter(buffer, entry["Normalized Sync Start Frame"])
+                self.write_parameter(buffer, entry["Unknown"])
+        buffer.write(u32(len(self.state_transitions)))
+        for entry in self.state_transitions:
+            buffer.write(u16(entry["Current Node"]))
+            buffer.write(u16(entry["Target Node"]))
+            buffer.write(u32(StateCheckType[entry["Check Type"]].value))
+            buffer.write(u8(1 if entry["Transition to Next Instead of Target"] else 0))
+            buffer.write(u8(1 if entry["Skip Transition"] else 0))
+            buffer.write(u16(0))
+            buffer.write(u32(entry["Unknown"]))
+            for param in entry["Parameters"]:
+                if "Value 1" in param:
+                    if isinstance(param["Value 1"], dict):
+                        if "Type" in param["Value 1"]:
+                            if param["Value 1"]["Type"] in ["float", "vec3f"]:
+                                buffer.write(u16(1))
+                            elif param["Value 1"]["Type"] == "int":
+                                buffer.write(u16(2))
+                            elif param["Value 1"]["Type"] == "string":
+                                buffer.write(u16(3))
+                            else:
+                                raise ValueError("Invalid State Transition Parameter Type")
+                        elif "Command Data Type" in param["Value 1"]:
+                            if param["Value 1"]["Command Data Type"] == 3:
+                                buffer.write(u16(3))
+                            else:
+                                buffer.write(u16(1))
+                        elif "Input" in param["Value 1"]:
+                            if isinstance(param["Value 1"]["Input"], float):
+                                buffer.write(u16(1))
+                            elif isinstance(param["Value 1"]["Input"], int):
+                                buffer.write(u16(2))
+                            elif isinstance(param["Value 1"]["Input"], str):
+                                buffer.write(u16(3))
+                            else:
+                                raise ValueError("Invalid State Transition Parameter Type")
+                    elif isinstance(param["Value 1"], float):
+                        buffer.write(u16(1))
+                    elif isinstance(param["Value 1"], int):
+                        buffer.write(u16(2))
+                    elif isinstance(param["Value 1"], str):
+                        buffer.write(u16(3))
+                    else:
+                        raise ValueError("Invalid State Transition Parameter Type")
+                else:
+                    buffer.write(u16(0))
+                buffer.write(u16(CompareOperator[param["Compare Type"]].value))
+                if "Value 1" in param:
+                    self.write_parameter(buffer, param["Value 1"])
+                    self.write_parameter(buffer, param["Value 2"])
                 else:
+                    buffer.write(u64(0))
+                    buffer.write(u64(0))
+        for event in self.events:
+            buffer.write(u32(len(event["Trigger Events"]) if "Trigger Events" in event else 0))
+            buffer.write(u32(len(event["Hold Events"]) if "Hold Events" in event else 0))
+            offset = buffer.tell() + 0x18 * (len(event["Trigger Events"]) if "Trigger Events" in event else 0)\
+                + 0x1c * (len(event["Hold Events"]) if "Hold Events" in event else 0)
+            if "Trigger Events" in event:
+                for trigger in event["Trigger Events"]:
+                    buffer.add_string(trigger["Name"])
+                    buffer.write(u32(buffer._string_refs[trigger["Name"]]))
+                    buffer.write(u32(trigger["Unknown"]))
+                    buffer.write(u32(offset))
+                    offset += 4 + 4 * len(trigger["Parameters"])
+                    buffer.write(u32(8 * len(trigger["Parameters"])))
+                    buffer.write(u32(int(trigger["Hash"], 16)))
+                    buffer.write(f32(trigger["Start Frame"]))
+            if "Hold Events" in event:
+                for hold in event["Hold Events"]:
+                    buffer.add_string(hold["Name"])
+                    buffer.write(u32(buffer._string_refs[hold["Name"]]))
+                    buffer.write(u32(hold["Unknown"]))
+                    buffer.write(u32(offset))
+                    offset += 4 + 4 * len(hold["Parameters"])
+                    buffer.write(u32(8 * len(hold["Parameters"])))
+                    buffer.write(u32(int(hold["Hash"], 16)))
+                    buffer.write(f32(hold["Start Frame"]))
+                    buffer.write(f32(hold["End Frame"]))
+            if "Trigger Events" in event:
+                for trigger in event["Trigger Events"]:
+                    buffer.write(u32(len(trigger["Parameters"])))
+                    for param in trigger["Parameters"]:
+                        if isinstance(param, str):
+                            flag = 0x40 << 24
+                        elif isinstance(param, float):
+                            flag = 0x30 << 24
+                        elif isinstance(param, bool): # have to put bool first bc bool inherits from int
+                            flag = 0x10 << 24
+                        elif isinstance(param, int):
+                            flag = 0x20 << 24
+                        else:
+                            raise ValueError(param)
+                        buffer.write(u32(offset | flag))
+                        offset += 8
+            if "Hold Events" in event:
+                for hold in event["Hold Events"]:
+                    buffer.write(u32(len(hold["Parameters"])))
+                    for param in hold["Parameters"]:
+                        if isinstance(param, str):
+                            flag = 0x40 << 24
+                        elif isinstance(param, float):
+                            flag = 0x30 << 24
+                        elif isinstance(param, bool):
+                            flag = 0x10 << 24
+                        elif isinstance(param, int):
+                            flag = 0x20 << 24
+                        else:
+                            raise ValueError(param)
+                        buffer.write(u32(offset | flag))
+                        offset += 8
+            if "Trigger Events" in event:
+                for trigger in event["Trigger Events"]:
+                    for param in trigger["Parameters"]:
+                        self.write_parameter(buffer, param)
+            if "Hold Events" in event:
+                for hold in event["Hold Events"]:
+                    for param in hold["Parameters"]:
+                        self.write_parameter(buffer, param)
+        buffer.write(u32(len(self.transitions)))
+        buffer.write(u32(0)) # tf does this do
+        offset = buffer.tell() + 0xc * len(self.transitions)
+        for transition in self.transitions:
+            buffer.write(u32(len(transition["Transitions"])))
+            buffer.write(s32(transition["Unknown"]))
+            buffer.write(u32(offset))
+            offset += 0x20 * len(transition["Transitions"])
+        for transition in self.transitions:
+            for entry in transition["Transitions"]:
+                buffer.add_string(entry["Current Command"])
+                buffer.write(u32(buffer._string_refs[entry["Current Command"]]))
+                buffer.add_string(entry["Next Command"])
+                buffer.write(u32(buffer._string_refs[entry["Next Command"]]))
+                if entry["Parameter Type"] == "int":
                     buffer.write(u8(0))
-                buffer.write(u8(1 if node["No State Transition"] else 0))
-                if "Tags" in node:
-                    for tag in node["Tags"]:
-                        buffer.add_string(tag)
-                    buffer.write(u32(tag_map[tuple(node["Tags"])]))
+                elif entry["Parameter Type"] == "string":
+                    buffer.write(u8(1))
+                elif entry["Parameter Type"] == "float":
+                    buffer.write(u8(2))
+                elif entry["Parameter Type"] == "bool":
+                    buffer.write(u8(3))
+                elif entry["Parameter Type"] == "vec3f":
+                    buffer.write(u8(4))
                 else:
-                    buffer.write(u32(0))
-                buffer.write(u32(body_offset))
-                body_offset += body_sizes[node["Node Index"]]
-                buffer.write(u16(calc_index))
-                if "Calc Controllers" in node:
-                    calc_index += len(node["Calc Controllers"])
-                    buffer.write(u16(len(node["Calc Controllers"])))
+                    raise ValueError(f"Invalid parameter type {entry['Parameter Type']}")
+                buffer.write(u8(1 if entry["Allow Multiple Matches"] else 0))
+                if "Command Group" in entry:
+                    buffer.write(u16(command_group_indices[freeze(entry["Command Group"])] + 1))
                 else:
                     buffer.write(u16(0))
-                buffer.write(u16(sync_index))
-                if "Sync Controls" in node:
-                    sync_index += len(node["Sync Controls"])
-                if "ASMarking" in node:
-                    buffer.write(u16(self.as_markings.index(node["ASMarking"]) + 1))
+                buffer.add_string(entry["Parameter"])
+                buffer.write(u32(buffer._string_refs[entry["Parameter"]]))
+                self.write_parameter(buffer, entry["Value"])
+                if entry["Parameter Type"] != "vec3f":
+                    buffer.write(u64(0))
+        if self.command_groups:
+            buffer.write(u32(len(self.command_groups)))
+            offset = buffer.tell() + 4 * len(self.command_groups)
+            for group in self.command_groups:
+                buffer.write(u32(offset))
+                offset += 4 + len(group) * 4
+            for group in self.command_groups:
+                buffer.write(u32(len(group)))
+                for cmd in group:
+                    buffer.add_string(cmd)
+                    buffer.write(u32(buffer._string_refs[cmd]))
+        if self.blackboard:
+            index = 0
+            pos = 0
+            for t in blackboard_types:
+                if t in self.blackboard:
+                    buffer.write(u16(len(self.blackboard[t])))
                 else:
                     buffer.write(u16(0))
-                self.write_guid(buffer, node["GUID"])
-            for offset in event_offsets:
-                buffer.write(u32(offset))
-            event_index = 0
-            for node in self.nodes:
-                if "Body" in node:
-                    body = node["Body"]
-                    if node["Node Type"] == "FloatSelector":
-                        self.write_parameter(buffer, body["Parameter"])
-                        self.write_parameter(buffer, body["Is Sync"])
-                        buffer.write(u32(1 if body["Force Run"] else 0))
-                        self.write_connections(buffer, body, node["Node Type"])
-                    elif node["Node Type"] == "StringSelector":
-                        self.write_parameter(buffer, body["Parameter"])
-                        self.write_parameter(buffer, body["Is Sync"])
-                        buffer.write(u32(1 if body["Force Run"] else 0))
-                        self.write_connections(buffer, body, node["Node Type"])
-                    elif node["Node Type"] == "SkeletalAnimation":
-                        self.write_parameter(buffer, body["Animation"])
-                        buffer.write(u32(body["Unknown 1"]))
-                        buffer.write(u32(body["Unknown 2"]))
-                        self.write_parameter(buffer, body["Unknown 3"])
-                        self.write_parameter(buffer, body["Unknown 4"])
-                        self.write_connections(buffer, body, node["Node Type"])
-                    elif node["Node Type"] == "State":
-                        self.write_connections(buffer, body, node["Node Type"])
-                    elif node["Node Type"] == "OneDimensionalBlender":
-                        self.write_parameter(buffer, body["Parameter"])
-                        buffer.write(u32(body["Lerp Mode"]))
-                        self.write_connections(buffer, body, node["Node Type"])
-                    elif node["Node Type"] == "Sequential":
-                        self.write_parameter(buffer, body["Use Sync Range Mult"])
-                        self.write_parameter(buffer, body["Sync Range Mult"])
-                        self.write_parameter(buffer, body["Unknown 3"])
-                        self.write_connections(buffer, body, node["Node Type"])
-                    elif node["Node Type"] == "IntSelector":
-                        self.write_parameter(buffer, body["Parameter"])
-                        self.write_parameter(buffer, body["Is Sync"])
-                        buffer.write(u32(1 if body["Force Run"] else 0))
-                        self.write_connections(buffer, body, node["Node Type"])
-                    elif node["Node Type"] == "Simultaneous":
-                        buffer.write(u32(body["Finish With Child"]))
-                        self.write_connections(buffer, body, node["Node Type"])
-                    elif node["Node Type"] == "Event":
-                        buffer.write(u32(event_index))
-                        event_index += 1
-                        self.write_connections(buffer, body, node["Node Type"])
-                    elif node["Node Type"] == "MaterialAnimation":
-                        if "Material Blend Setting" in body:
-                            buffer.write(u32(self.material_blend.index(body["Material Blend Setting"]) + 1))
-                        else:
-                            buffer.write(u32(0))
-                        self.write_parameter(buffer, body["Animation"])
-                        self.write_parameter(buffer, body["Is Loop"])
-                        self.write_connections(buffer, body, node["Node Type"])
-                    elif node["Node Type"] == "FrameController":
-                        self.write_parameter(buffer, body["Animation Rate"])
-                        self.write_parameter(buffer, body["Start Frame"])
-                        self.write_parameter(buffer, body["End Frame"])
-                        buffer.write(u32(body["Loop Flags"]))
-                        self.write_parameter(buffer, body["Loop Cancel Flag"])
-                        self.write_parameter(buffer, body["Unknown 2"])
-                        self.write_parameter(buffer, body["Loop Num"])
-                        self.write_parameter(buffer, body["Max Random Loop Num"])
-                        self.write_parameter(buffer, body["Is Not Use Random Bonus Loop"])
-                        self.write_parameter(buffer, body["Animation Freeze Point"])
-                        self.write_parameter(buffer, body["Animation Freeze Frame"])
-                        self.write_parameter(buffer, body["Loop Duration"])
-                        buffer.write(u32(1 if body["Is Include Initial Loop"] else 0))
-                        self.write_parameter(buffer, body["Unknown 10"])
-                        self.write_parameter(buffer, body["Unknown 11"])
-                        buffer.write(u32(body["Unknown 12"]))
-                        buffer.write(u32(body["Unknown 13"]))
-                        self.write_connections(buffer, body, node["Node Type"])
-                    elif node["Node Type"] == "DummyAnimation":
-                        self.write_parameter(buffer, body["Frame"])
-                        self.write_parameter(buffer, body["Is Loop"])
-                        self.write_connections(buffer, body, node["Node Type"])
-                    elif node["Node Type"] == "RandomSelector":
-                        buffer.write(u32(SelectFlag[body["Select Flag"]].value))
-                        self.write_parameter(buffer, body["Is Sync"])
-                        self.write_parameter(buffer, body["Max Cached Select Count"])
-                        buffer.write(u32(1 if body["Force Run"] else 0))
-                        self.write_connections(buffer, body, node["Node Type"])
-                    elif node["Node Type"] == "PreviousTagSelector":
-                        buffer.write(u32(body["Tag Set Index"]))
-                        self.write_connections(buffer, body, node["Node Type"], tag_map)
-                    elif node["Node Type"] == "BonePositionSelector":
-                        self.write_parameter(buffer, body["Bone 1"])
-                        self.write_parameter(buffer, body["Bone 2"])
-                        buffer.write(u32(Axis[body["Axis"]].value))
-                        buffer.write(u32(SelectFlag[body["Select Flag"]].value))
-                        self.write_parameter(buffer, body["Is Sync"])
-                        self.write_connections(buffer, body, node["Node Type"])
-                    elif node["Node Type"] == "BoneAnimation":
-                        self.write_parameter(buffer, body["Animation"])
-                        self.write_parameter(buffer, body["Is Loop"])
-                        self.write_parameter(buffer, body["Unknown 2"])
-                        self.write_parameter(buffer, body["Unknown 3"])
-                        self.write_connections(buffer, body, node["Node Type"])
-                    elif node["Node Type"] == "InitialFrame":
-                        buffer.write(u32(InitialFrameCalcMode[body["Calc Mode"]].value))
-                        if "Tags" in body:
-                            buffer.write(u32(tag_map[tuple(body["Tags"])]))
-                        else:
-                            buffer.write(u32(0))
-                        self.write_parameter(buffer, body["Unknown 1"])
-                        self.write_parameter(buffer, body["Bone 1"])
-                        self.write_parameter(buffer, body["Bone 2"])
-                        buffer.write(u32(Axis[body["Axis"]].value))
-                        self.write_parameter(buffer, body["Calc Loop"])
-                        self.write_parameter(buffer, body["Exclude Random Loops"])
-                        self.write_connections(buffer, body, node["Node Type"])
-                    elif node["Node Type"] == "BoneBlender":
-                        self.write_parameter(buffer, body["Bone Group Name"])
-                        buffer.write(u32(body["Unknown 1"]))
-                        self.write_parameter(buffer, body["Blend Rate"])
-                        buffer.write(u32(body["Unknown 3"]))
-                        buffer.write(u32(body["Unknown 4"]))
-                        self.write_connections(buffer, body, node["Node Type"])
-                    elif node["Node Type"] == "BoolSelector":
-                        self.write_parameter(buffer, body["Parameter"])
-                        self.write_parameter(buffer, body["Is Sync"])
-                        buffer.write(u32(1 if body["Force Run"] else 0))
-                        self.write_connections(buffer, body, node["Node Type"])
-                    elif node["Node Type"] == "Alert":
-                        self.write_parameter(buffer, body["Message"])
-                        self.write_connections(buffer, body, node["Node Type"])
-                    elif node["Node Type"] == "SubtractAnimation":
-                        self.write_connections(buffer, body, node["Node Type"])
-                    elif node["Node Type"] == "ShapeAnimation":
-                        self.write_parameter(buffer, body["Animation"])
-                        self.write_connections(buffer, body, node["Node Type"])
-                    elif node["Node Type"] == "Unknown7":
-                        self.write_connections(buffer, body, node["Node Type"])
-                    else:
-                        raise ValueError(f"Invalid node type {node['Node Type']}")
-            for entry in sync_ctrl:
-                buffer.write(u32(self.sync_ctrl.index(entry)))
-            value_offset = offsets["Sync Control"] + 0x18 * len(self.sync_ctrl)
-            for entry in self.sync_ctrl:
-                if "Fade In Frame" in entry:
-                    type = 0
-                elif "Sync Start Frame" in entry:
-                    type = 1
+                buffer.write(u16(index))
+                if t in self.blackboard:
+                    index += len(self.blackboard[t])
+                if t == "vec3f" and "vec3f" in self.blackboard:
+                    buffer.write(u16(pos))
+                    pos = pos + len(self.blackboard[t]) * 12
+                elif t in self.blackboard:
+                    buffer.write(u16(pos))
+                    pos = pos + len(self.blackboard[t]) * 4
                 else:
-                    type = 3
-                buffer.write(u32(type))
-                buffer.write(u32(value_offset))
-                if type == 0:
-                    value_offset += 12
-                elif type == 1:
-                    value_offset += 24
-                # Scuffed but works
-                self.write_guid(buffer, entry["GUID"])
-            for entry in self.sync_ctrl:
-                if "Fade In Frame" in entry:
-                    self.write_parameter(buffer, entry["Fade In Frame"])
-                    buffer.write(u32(entry["Unknown"]))
-                elif "Sync Start Frame" in entry:
-                    self.write_parameter(buffer, entry["Sync Start Frame"])
-                    self.write_parameter(buffer, entry["Normalized Sync Start Frame"])
-                    self.write_parameter(buffer, entry["Unknown"])
-            buffer.write(u32(len(self.state_transitions)))
-            for entry in self.state_transitions:
-                buffer.write(u16(entry["Current Node"]))
-                buffer.write(u16(entry["Target Node"]))
-                buffer.write(u32(StateCheckType[entry["Check Type"]].value))
-                buffer.write(u8(1 if entry["Transition to Next Instead of Target"] else 0))
-                buffer.write(u8(1 if entry["Skip Transition"] else 0))
+                    buffer.write(u16(pos))
                 buffer.write(u16(0))
-                buffer.write(u32(entry["Unknown"]))
-                for param in entry["Parameters"]:
-                    if "Value 1" in param:
-                        if isinstance(param["Value 1"], dict):
-                            if "Type" in param["Value 1"]:
-                                if param["Value 1"]["Type"] in ["float", "vec3f"]:
-                                    buffer.write(u16(1))
-                                elif param["Value 1"]["Type"] == "int":
-                                    buffer.write(u16(2))
-                                elif param["Value 1"]["Type"] == "string":
-                                    buffer.write(u16(3))
-                                else:
-                                    raise ValueError("Invalid State Transition Parameter Type")
-                            elif "Command Data Type" in param["Value 1"]:
-                                if param["Value 1"]["Command Data Type"] == 3:
-                                    buffer.write(u16(3))
-                                else:
-                                    buffer.write(u16(1))
-                            elif "Input" in param["Value 1"]:
-                                if isinstance(param["Value 1"]["Input"], float):
-                                    buffer.write(u16(1))
-                                elif isinstance(param["Value 1"]["Input"], int):
-                                    buffer.write(u16(2))
-                                elif isinstance(param["Value 1"]["Input"], str):
-                                    buffer.write(u16(3))
-                                else:
-                                    raise ValueError("Invalid State Transition Parameter Type")
-                        elif isinstance(param["Value 1"], float):
-                            buffer.write(u16(1))
-                        elif isinstance(param["Value 1"], int):
-                            buffer.write(u16(2))
-                        elif isinstance(param["Value 1"], str):
-                            buffer.write(u16(3))
-                        else:
-                            raise ValueError("Invalid State Transition Parameter Type")
-                    else:
-                        buffer.write(u16(0))
-                    buffer.write(u16(CompareOperator[param["Compare Type"]].value))
-                    if "Value 1" in param:
-                        self.write_parameter(buffer, param["Value 1"])
-                        self.write_parameter(buffer, param["Value 2"])
-                    else:
-                        buffer.write(u64(0))
-                        buffer.write(u64(0))
-            for event in self.events:
-                buffer.write(u32(len(event["Trigger Events"]) if "Trigger Events" in event else 0))
-                buffer.write(u32(len(event["Hold Events"]) if "Hold Events" in event else 0))
-                offset = buffer.tell() + 0x18 * (len(event["Trigger Events"]) if "Trigger Events" in event else 0)\
-                    + 0x1c * (len(event["Hold Events"]) if "Hold Events" in event else 0)
-                if "Trigger Events" in event:
-                    for trigger in event["Trigger Events"]:
-                        buffer.add_string(trigger["Name"])
-                        buffer.write(u32(buffer._string_refs[trigger["Name"]]))
-                        buffer.write(u32(trigger["Unknown"]))
-                        buffer.write(u32(offset))
-                        offset += 4 + 4 * len(trigger["Parameters"])
-                        buffer.write(u32(8 * len(trigger["Parameters"])))
-                        buffer.write(u32(int(trigger["Hash"], 16)))
-                        buffer.write(f32(trigger["Start Frame"]))
-                if "Hold Events" in event:
-                    for hold in event["Hold Events"]:
-                        buffer.add_string(hold["Name"])
-                        buffer.write(u32(buffer._string_refs[hold["Name"]]))
-                        buffer.write(u32(hold["Unknown"]))
-                        buffer.write(u32(offset))
-                        offset += 4 + 4 * len(hold["Parameters"])
-                        buffer.write(u32(8 * len(hold["Parameters"])))
-                        buffer.write(u32(int(hold["Hash"], 16)))
-                        buffer.write(f32(hold["Start Frame"]))
-                        buffer.write(f32(hold["End Frame"]))
-                if "Trigger Events" in event:
-                    for trigger in event["Trigger Events"]:
-                        buffer.write(u32(len(trigger["Parameters"])))
-                        for param in trigger["Parameters"]:
-                            if isinstance(param, str):
-                                flag = 0x40 << 24
-                            elif isinstance(param, float):
-                                flag = 0x30 << 24
-                            elif isinstance(param, bool): # have to put bool first bc bool inherits from int
-                                flag = 0x10 << 24
-                            elif isinstance(param, int):
-                                flag = 0x20 << 24
-                            else:
-                                raise ValueError(param)
-                            buffer.write(u32(offset | flag))
-                            offset += 8
-                if "Hold Events" in event:
-                    for hold in event["Hold Events"]:
-                        buffer.write(u32(len(hold["Parameters"])))
-                        for param in hold["Parameters"]:
-                            if isinstance(param, str):
-                                flag = 0x40 << 24
-                            elif isinstance(param, float):
-                                flag = 0x30 << 24
-                            elif isinstance(param, bool):
-                                flag = 0x10 << 24
-                            elif isinstance(param, int):
-                                flag = 0x20 << 24
-                            else:
-                                raise ValueError(param)
-                            buffer.write(u32(offset | flag))
-                            offset += 8
-                if "Trigger Events" in event:
-                    for trigger in event["Trigger Events"]:
-                        for param in trigger["Parameters"]:
-                            self.write_parameter(buffer, param)
-                if "Hold Events" in event:
-                    for hold in event["Hold Events"]:
-                        for param in hold["Parameters"]:
-                            self.write_parameter(buffer, param)
-            buffer.write(u32(len(self.transitions)))
-            buffer.write(u32(0)) # tf does this do
-            offset = buffer.tell() + 0xc * len(self.transitions)
-            for transition in self.transitions:
-                buffer.write(u32(len(transition["Transitions"])))
-                buffer.write(s32(transition["Unknown"]))
-                buffer.write(u32(offset))
-                offset += 0x20 * len(transition["Transitions"])
-            for transition in self.transitions:
-                for entry in transition["Transitions"]:
-                    buffer.add_string(entry["Current Command"])
-                    buffer.write(u32(buffer._string_refs[entry["Current Command"]]))
-                    buffer.add_string(entry["Next Command"])
-                    buffer.write(u32(buffer._string_refs[entry["Next Command"]]))
-                    if entry["Parameter Type"] == "int":
-                        buffer.write(u8(0))
-                    elif entry["Parameter Type"] == "string":
-                        buffer.write(u8(1))
-                    elif entry["Parameter Type"] == "float":
-                        buffer.write(u8(2))
-                    elif entry["Parameter Type"] == "bool":
-                        buffer.write(u8(3))
-                    elif entry["Parameter Type"] == "vec3f":
-                        buffer.write(u8(4))
-                    else:
-                        raise ValueError(f"Invalid parameter type {entry['Parameter Type']}")
-                    buffer.write(u8(1 if entry["Allow Multiple Matches"] else 0))
-                    if "Command Group" in entry:
-                        buffer.write(u16(self.command_groups.index(entry["Command Group"]) + 1))
-                    else:
-                        buffer.write(u16(0))
-                    buffer.add_string(entry["Parameter"])
-                    buffer.write(u32(buffer._string_refs[entry["Parameter"]]))
-                    self.write_parameter(buffer, entry["Value"])
-                    if entry["Parameter Type"] != "vec3f":
-                        buffer.write(u64(0))
-            if self.command_groups:
-                buffer.write(u32(len(self.command_groups)))
-                offset = buffer.tell() + 4 * len(self.command_groups)
-                for group in self.command_groups:
-                    buffer.write(u32(offset))
-                    offset += 4 + len(group) * 4
-                for group in self.command_groups:
-                    buffer.write(u32(len(group)))
-                    for cmd in group:
-                        buffer.add_string(cmd)
-                        buffer.write(u32(buffer._string_refs[cmd]))
-            if self.blackboard:
-                index = 0
-                pos = 0
-                for t in blackboard_types:
-                    if t in self.blackboard:
-                        buffer.write(u16(len(self.blackboard[t])))
-                    else:
-                        buffer.write(u16(0))
-                    buffer.write(u16(index))
-                    if t in self.blackboard:
-                        index += len(self.blackboard[t])
-                    if t == "vec3f" and "vec3f" in self.blackboard:
-                        buffer.write(u16(pos))
-                        pos = pos + len(self.blackboard[t]) * 12
-                    elif t in self.blackboard:
-                        buffer.write(u16(pos))
-                        pos = pos + len(self.blackboard[t]) * 4
-                    else:
-                        buffer.write(u16(pos))
-                    buffer.write(u16(0))
-                files = []
-                for t in self.blackboard:
-                    for entry in self.blackboard[t]:
-                        buffer.add_string(entry["Name"])
-                        name_offset = buffer._string_refs[entry["Name"]]
-                        if "Reference File" in entry:
-                            if entry["Reference File"] not in files:
-                                files.append(entry["Reference File"])
-                            name_offset = name_offset | (1 << 31)
-                            name_offset = name_offset | (files.index(entry["Reference File"]) << 24)
-                        buffer.write(u32(name_offset))
-                start = buffer.tell()
-                size = 0
-                for t in self.blackboard:
-                    for entry in self.blackboard[t]:
-                        if t == "int":
-                            buffer.write(u32(entry["Init Value"]))
-                            size += 4
-                        if t == "float":
-                            buffer.write(f32(entry["Init Value"]))
-                            size += 4
-                        if t == "bool":
-                            buffer.write(u32(int(entry["Init Value"])))
-                            size += 4
-                        if t == "vec3f":
-                            buffer.write(f32(entry["Init Value"][0]))
-                            buffer.write(f32(entry["Init Value"][1]))
-                            buffer.write(f32(entry["Init Value"][2]))
-                            size += 12
-                        if t == "string":
-                            buffer.add_string(entry["Init Value"])
-                            buffer.write(u32(buffer._string_refs[entry["Init Value"]]))
-                            size += 4
-                buffer.seek(start + size)
-                for file in files:
-                    buffer.add_string(file)
-                    buffer.write(u32(buffer._string_refs[file]))
-                    buffer.write(u32(mmh3.hash(file, signed=False)))
-                    buffer.write(u32(mmh3.hash(os.path.splitext(os.path.basename(file))[0], signed=False)))
-                    buffer.write(u32(mmh3.hash(os.path.splitext(file)[1].replace('.', ''), signed=False)))        
+            files = {} # maps each reference file to its index
+            for t in self.blackboard:
+                for entry in self.blackboard[t]:
+                    buffer.add_string(entry["Name"])
+                    name_offset = buffer._string_refs[entry["Name"]]
+                    if "Reference File" in entry:
+                        files.setdefault(entry["Reference File"], len(files))
+                        name_offset = name_offset | (1 << 31)
+                        name_offset = name_offset | (files[entry["Reference File"]] << 24)
+                    buffer.write(u32(name_offset))
+            start = buffer.tell()
+            size = 0
+            for t in self.blackboard:
+                for entry in self.blackboard[t]:
+                    if t == "int":
+                        buffer.write(u32(entry["Init Value"]))
+                        size += 4
+                    if t == "float":
+                        buffer.write(f32(entry["Init Value"]))
+                        size += 4
+                    if t == "bool":
+                        buffer.write(u32(int(entry["Init Value"])))
+                        size += 4
+                    if t == "vec3f":
+                        buffer.write(f32(entry["Init Value"][0]))
+                        buffer.write(f32(entry["Init Value"][1]))
+                        buffer.write(f32(entry["Init Value"][2]))
+                        size += 12
+                    if t == "string":
+                        buffer.add_string(entry["Init Value"])
+                        buffer.write(u32(buffer._string_refs[entry["Init Value"]]))
+                        size += 4
+            buffer.seek(start + size)
+            for file in files:
+                buffer.add_string(file)
+                buffer.write(u32(buffer._string_refs[file]))
+                buffer.write(u32(mmh3.hash(file, signed=False)))
+                buffer.write(u32(mmh3.hash(os.path.splitext(os.path.basename(file))[0], signed=False)))
+                buffer.write(u32(mmh3.hash(os.path.splitext(file)[1].replace('.', ''), signed=False)))        
+        else:
+            buffer.skip(48)
+        for entry in self.partials:
+            buffer.write(u16(len(entry["Bones"])))
+            buffer.write(u16(1 if entry["Is Material Slot"] else 0))
+            buffer.add_string(entry["Name"])
+            buffer.add_string(entry["Unknown"])
+            buffer.write(u32(buffer._string_refs[entry["Name"]]))
+            buffer.write(u32(buffer._string_refs[entry["Unknown"]]))
+            for slot in entry["Bones"]:
+                buffer.add_string(slot["Name"])
+                buffer.write(u32(buffer._string_refs[slot["Name"]]))
+                buffer.write(u16(slot["Unknown 1"]))
+                buffer.write(u16(slot["Unknown 2"]))
+        offset = buffer.tell() + 0x10 * len(self.bone_groups)
+        for group in self.bone_groups:
+            buffer.write(u32(offset))
+            offset += 8 * len(group["Bones"])
+            buffer.add_string(group["Name"])
+            buffer.write(u32(buffer._string_refs[group["Name"]]))
+            buffer.write(u32(len(group["Bones"])))
+            buffer.write(u32(group["Unknown"]))
+        for group in self.bone_groups:
+            for bone in group["Bones"]:
+                buffer.add_string(bone["Name"])
+                buffer.write(u32(buffer._string_refs[bone["Name"]]))
+                buffer.write(f32(bone["Unknown"]))
+        for entry in self.calc_ctrl:
+            flag = 0
+            if "Command Data Type" in entry["Parameter"]:
+                flag |= 1 << 0x1F
+                flag |= entry["Parameter"]["Command Data Type"] & 0xFFFF
             else:
-                buffer.skip(48)
-            for entry in self.partials:
-                buffer.write(u16(len(entry["Bones"])))
-                buffer.write(u16(1 if entry["Is Material Slot"] else 0))
-                buffer.add_string(entry["Name"])
-                buffer.add_string(entry["Unknown"])
-                buffer.write(u32(buffer._string_refs[entry["Name"]]))
-                buffer.write(u32(buffer._string_refs[entry["Unknown"]]))
-                for slot in entry["Bones"]:
-                    buffer.add_string(slot["Name"])
-                    buffer.write(u32(buffer._string_refs[slot["Name"]]))
-                    buffer.write(u16(slot["Unknown 1"]))
-                    buffer.write(u16(slot["Unknown 2"]))
-            offset = buffer.tell() + 0x10 * len(self.bone_groups)
-            for group in self.bone_groups:
-                buffer.write(u32(offset))
-                offset += 8 * len(group["Bones"])
-                buffer.add_string(group["Name"])
-                buffer.write(u32(buffer._string_refs[group["Name"]]))
-                buffer.write(u32(len(group["Bones"])))
-                buffer.write(u32(group["Unknown"]))
-            for group in self.bone_groups:
-                for bone in group["Bones"]:
-                    buffer.add_string(bone["Name"])
-                    buffer.write(u32(buffer._string_refs[bone["Name"]]))
-                    buffer.write(f32(bone["Unknown"]))
-            for entry in self.calc_ctrl:
-                flag = 0
-                if "Command Data Type" in entry["Parameter"]:
-                    flag |= 1 << 0x1F
-                    flag |= entry["Parameter"]["Command Data Type"] & 0xFFFF
-                else:
-                    flag |= entry["Parameter"]["Blackboard Index"] & 0xFFFF
-                buffer.write(u32(flag))
-                buffer.write(f32(entry["Adjust Value"]))
-                buffer.write(u32(Mode[entry["Calc Mode"]].value))
-                buffer.write(f32(entry["Default Value"]))
-                buffer.write(f32(entry["Adjust Rate"]))
-                buffer.write(f32(entry["Base Result"]))
-                buffer.write(f32(entry["Min"]))
-                buffer.write(f32(entry["Max"]))
-            buffer.write(u32(len(self.valid_tags)))
-            for tag in self.valid_tags:
+                flag |= entry["Parameter"]["Blackboard Index"] & 0xFFFF
+            buffer.write(u32(flag))
+            buffer.write(f32(entry["Adjust Value"]))
+            buffer.write(u32(Mode[entry["Calc Mode"]].value))
+            buffer.write(f32(entry["Default Value"]))
+            buffer.write(f32(entry["Adjust Rate"]))
+            buffer.write(f32(entry["Base Result"]))
+            buffer.write(f32(entry["Min"]))
+            buffer.write(f32(entry["Max"]))
+        buffer.write(u32(len(self.valid_tags)))
+        for tag in self.valid_tags:
+            buffer.add_string(tag)
+            buffer.write(u32(buffer._string_refs[tag]))
+        for group in tag_groups:
+            buffer.write(u32(len(group)))
+            for tag in group:
                 buffer.add_string(tag)
-                buffer.write(u32(buffer._string_refs[tag]))
-            for group in tag_groups:
-                buffer.write(u32(len(group)))
-                for tag in group:
-                    buffer.add_string(tag)
-                    buffer.write(u32(buffer._string_refs[tag]))  
-            buffer.seek(offsets["ASMarkings"])
-            buffer.write(u32(len(self.as_markings)))
-            for triplet in self.as_markings:
-                for string in triplet:
-                    buffer.add_string(string)
-                    buffer.write(u32(buffer._string_refs[string]))
-            buffer.write(u32(len(self.material_blend)))
-            for entry in self.material_blend:
-                buffer.add_string(entry["Name"])
-                buffer.write(u32(buffer._string_refs[entry["Name"]]))
-                buffer.write(f32(entry["Blend Start"]))
-            buffer.write(u32(0)) # enum resolve
-            buffer.write(buffer._strings)
-            buffer.seek(0x50)
-            buffer.write(u32(len(buffer._strings)))
-        
-        if self.has_asnode_baev:
-            events = {}
-            for node in self.nodes:
-                if "BAEV Events" in node:
-                    events["0x%08x" % calc_hash(node["GUID"])] = node["BAEV Events"]
-            anim_events = BAEV.from_dict(events, self.filename)
-            anim_events.to_binary(output_dir)
\ No newline at end of file
+                buffer.write(u32(buffer._string_refs[tag]))  
+        buffer.seek(offsets["ASMarkings"])
+        buffer.write(u32(len(self.as_markings)))
+        for triplet in self.as_markings:
+            for string in triplet:
+                buffer.add_string(string)
+                buffer.write(u32(buffer._string_refs[string]))
+        buffer.write(u32(len(self.material_blend)))
+        for entry in self.material_blend:
+            buffer.add_string(entry["Name"])
+            buffer.write(u32(buffer._string_refs[entry["Name"]]))
+            buffer.write(f32(entry["Blend Start"]))
+        buffer.write(u32(0)) # enum resolve
+        buffer.write(buffer._strings)
+        buffer.seek(0x50)
+        buffer.write(u32(len(buffer._strings)))
+        return stream.getvalue()
+
+    # Builds the AsNode BAEV file from the node events (None if the file doesn't have one)
+    def export_baev(self):
+        if not self.has_asnode_baev:
+            return None
+        events = {}
+        for node in self.nodes:
+            if "BAEV Events" in node:
+                events["0x%08x" % calc_hash(node["GUID"])] = node["BAEV Events"]
+        return BAEV.from_dict(events, self.filename)
+
+    def to_binary(self, output_dir=""):
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        with open(os.path.join(output_dir, self.filename + ".asb"), "wb") as f:
+            f.write(self.to_bytes())
+        anim_events = self.export_baev()
+        if anim_events is not None:
+            anim_events.to_binary(output_dir)
+
+
+# Node body layout for each node type
+# size is the fixed part of the body (before the connection indices)
+# child_size is the size of each child entry (conditions/weights/tags + node index)
+NodeInfo = namedtuple("NodeInfo", ["reader", "writer", "size", "child_size"])
+
+node_registry = {
+    NodeType.FloatSelector.value         : NodeInfo(ASB.FloatSelector, ASB.write_float_selector, 0x20, 20),
+    NodeType.StringSelector.value        : NodeInfo(ASB.StringSelector, ASB.write_string_selector, 0x20, 12),
+    NodeType.SkeletalAnimation.value     : NodeInfo(ASB.SkeletalAnimation, ASB.write_skeletal_animation, 0x2c, 4),
+    NodeType.State.value                 : NodeInfo(ASB.State, ASB.write_state, 0xc, 4),
+    NodeType.Unknown2.value              : NodeInfo(None, None, 0x0, 4), # No node body
+    NodeType.OneDimensionalBlender.value : NodeInfo(ASB.OneDimensionalBlender, ASB.write_one_dimensional_blender, 0x18, 20),
+    NodeType.Sequential.value            : NodeInfo(ASB.Sequential, ASB.write_sequential, 0x24, 4),
+    NodeType.IntSelector.value           : NodeInfo(ASB.IntSelector, ASB.write_int_selector, 0x20, 12),
+    NodeType.Simultaneous.value          : NodeInfo(ASB.Simultaneous, ASB.write_simultaneous, 0x10, 4),
+    NodeType.Event.value                 : NodeInfo(ASB.EventNode, ASB.write_event_node, 0x10, 4),
+    NodeType.MaterialAnimation.value     : NodeInfo(ASB.MaterialAnimation, ASB.write_material_animation, 0x20, 4),
+    NodeType.FrameController.value       : NodeInfo(ASB.FrameController, ASB.write_frame_controller, 0x84, 4),
+    NodeType.DummyAnimation.value        : NodeInfo(ASB.DummyAnimation, ASB.write_dummy_animation, 0x1c, 4),
+    NodeType.RandomSelector.value        : NodeInfo(ASB.RandomSelector, ASB.write_random_selector, 0x24, 12),
+    NodeType.Unknown4.value              : NodeInfo(None, None, 0x0, 4), # No node body
+    NodeType.PreviousTagSelector.value   : NodeInfo(ASB.PreviousTagSelector, ASB.write_previous_tag_selector, 0x10, 8),
+    NodeType.BonePositionSelector.value  : NodeInfo(ASB.BonePositionSelector, ASB.write_bone_position_selector, 0x2c, 20),
+    NodeType.BoneAnimation.value         : NodeInfo(ASB.BoneAnimation, ASB.write_bone_animation, 0x2c, 4),
+    NodeType.InitialFrame.value          : NodeInfo(ASB.InitialFrame, ASB.write_initial_frame, 0x40, 4),
+    NodeType.BoneBlender.value           : NodeInfo(ASB.BoneBlender, ASB.write_bone_blender, 0x28, 4),
+    NodeType.BoolSelector.value          : NodeInfo(ASB.BoolSelector, ASB.write_bool_selector, 0x20, 4),
+    NodeType.Alert.value                 : NodeInfo(ASB.Alert, ASB.write_alert, 0x14, 4),
+    NodeType.SubtractAnimation.value     : NodeInfo(ASB.SubtractAnimation, ASB.write_subtract_animation, 0xc, 4),
+    NodeType.ShapeAnimation.value        : NodeInfo(ASB.ShapeAnimation, ASB.write_shape_animation, 0x14, 4),
+    NodeType.Unknown7.value              : NodeInfo(ASB.Unknown7, ASB.write_unknown7, 0xc, 4),
+}
+
+# Sections are read in this order by ASB.from_binary (later sections reference earlier ones)
+section_readers = {
+    "blackboard" : ASB.read_blackboard_section,
+    "expressions" : ASB.read_expressions_section,
+    "calc_ctrl" : ASB.read_calc_ctrl_section,
+    "commands" : ASB.read_commands_section,
+    "events" : ASB.read_events_section,
+    "sync_ctrl" : ASB.read_sync_ctrl_section,
+    "bone_groups" : ASB.read_bone_groups_section,
+    "command_groups" : ASB.read_command_groups_section,
+    "transitions" : ASB.read_transitions_section,
+    "valid_tags" : ASB.read_valid_tags_section,
+    "partials" : ASB.read_partials_section,
+    "as_markings" : ASB.read_as_markings_section,
+    "material_blend" : ASB.read_material_blend_section,
+    "state_transitions" : ASB.read_state_transitions_section,
+}
+section_order = list(section_readers)
+
+# Reads a section the first time it's accessed, the stream position is restored afterwards
+# so sections can be pulled in while a node is halfway through being decoded
+class LazySection:
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+        try:
+            return obj.sections[self.name]
+        except KeyError:
+            pos = obj.stream.tell()
+            obj.sections[self.name] = obj.read_lazy_section(self.name)
+            obj.stream.seek(pos)
+            return obj.sections[self.name]
+
+    def __set__(self, obj, value):
+        obj.sections[self.name] = value
+
+# Read-only view of an ASB file that only parses the header up front
+# Sections and nodes are decoded (and kept) the first time they're accessed, asdict() matches ASB.asdict()
+class LazyASB(ASB):
+    blackboard = LazySection()
+    expressions = LazySection()
+    calc_ctrl = LazySection()
+    commands = LazySection()
+    events = LazySection()
+    sync_ctrl = LazySection()
+    bone_groups = LazySection()
+    command_groups = LazySection()
+    transitions = LazySection()
+    valid_tags = LazySection()
+    partials = LazySection()
+    as_markings = LazySection()
+    material_blend = LazySection()
+    state_transitions = LazySection()
+    nodes = LazySection()
+
+    def __init__(self, stream, string_pool, header):
+        self.sections = {}
+        self.decoded_nodes = {}
+        self.typed = False
+        self.stream = stream
+        self.string_pool = string_pool
+        self.header = header
+        self.filename = string_pool.read_string(header.filename_offset)
+        self.version = header.version
+        self.has_asnode_baev = False
+
+    @classmethod
+    def from_binary(cls, data, romfs_path=""):
+        return cls(*cls.open_binary(data, romfs_path, lazy=True))
+
+    # There's nothing to decode lazily in a dict so this returns a regular ASB
+    @classmethod
+    def from_dict(cls, data):
+        return ASB.from_dict(data)
+
+    def read_lazy_section(self, name):
+        if name == "nodes":
+            return [self.node(i) for i in range(self.header.node_count)]
+        return section_readers[name](self)
+
+    def node(self, index):
+        if index < 0:
+            index += self.header.node_count
+        if not 0 <= index < self.header.node_count:
+            raise IndexError(f"Node index {index} out of range")
+        if index not in self.decoded_nodes:
+            pos = self.stream.tell()
+            self.stream.seek(self.node_offset + index * get_struct(node_header_format).size)
+            record = self.stream.read_record(node_header_format)
+            self.decoded_nodes[index] = self.read_node(record, self.header.sync_control_indices_offset, index)
+            self.stream.seek(pos)
+        return self.decoded_nodes[index]
+
+    # Only the nodes of the requested type are decoded, the filter only looks at the node headers
+    def iter_nodes(self, type=None):
+        if isinstance(type, NodeType):
+            type = type.name
+        pos = self.stream.tell()
+        types = [record[0] for record in self.read_node_headers()]
+        self.stream.seek(pos)
+        for i, node_type in enumerate(types):
+            if type is None or node_type_names.get(node_type) == type:
+                yield self.node(i)
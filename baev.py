@@ -2,71 +2,101 @@ try:
     from utils import *
 except ImportError:
     raise ImportError("utils.py not found")
+try:
+    import jsonio
+except ImportError:
+    raise ImportError("jsonio.py not found")
 
 import json
 import os
+import io
+from functools import lru_cache
+from types import MappingProxyType
+
+# Fixed-layout records
+array_format = "<QII" # offset, count, element size
+event_info_format = "<IIQII" # hash and padding followed by the node index array
+event_node_format = "<QIIII" # event array followed by the node hash and an unknown value
 
-# Hash function for baev hashes
-# The seed is the first string in the string pool (usually null)
+# Hash function for baev hashes (32-bit FNV-1a)
+# The seed is the first string in the string pool (usually null) and is hashed before the string
 # The string is either the node's GUID in the asb file or the animation's name
+fnv_offset_basis = 0x811c9dc5
+fnv_prime = 0x1000193
+
+def fnv1a(data, hash=fnv_offset_basis):
+    for byte in data:
+        hash = ((hash ^ byte) * fnv_prime) & 0xFFFFFFFF
+    return hash
+
+# Characters are hashed by code point, latin-1 covers every string whose code points fit in a byte
+def _hash_string(string):
+    try:
+        data = string.encode("latin-1")
+    except UnicodeEncodeError:
+        data = [ord(c) for c in string]
+    return fnv1a(data)
+
+# GUIDs and animation names repeat a lot across files so recent results are kept
+@lru_cache(maxsize=0x10000)
 def calc_hash(string, seed=""):
-    
-    length = len(string)
+    return _hash_string(seed + string)
+
+# Hashes a batch of strings in one call (bypasses the cache so large name tables don't evict it)
+def calc_hashes(strings, seed=""):
+    return [_hash_string(seed + string) for string in strings]
 
-    hash = 0x811c9dc5
-    const = 0x1000193
+# events.json is found next to this file rather than in the working directory
+events_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "events.json")
 
-    if seed != "":
-        i = len(seed) & 3
-        pos = 0
-        if len(seed) - 1 > 2:
-            while pos < len(seed) & 0xFFFFFFFFFFFFFFFC:
-                a = ord(seed[pos])
-                b = ord(seed[pos+1])
-                c = ord(seed[pos+2])
-                d = ord(seed[pos+3])
-                hash = ((((hash ^ a) * const ^ b) * const ^ c) * const ^ d) * const
-                pos += 4
-        while i != 0:
-            a = ord(string[pos])
-            hash = (hash ^ a) * const
-            pos += 1
-            i -= 1
+# Event name catalog, loaded on first use and shared by every BAEV instance (read-only)
+@lru_cache(maxsize=None)
+def load_event_list():
+    with open(events_path, "r", encoding="utf-8") as f:
+        events = json.load(f)
+    return MappingProxyType({key : tuple(names) for key, names in events.items()})
 
-    pos = 0
-    i = length & 3
-    while i != 0:
-        a = ord(string[pos])
-        hash = (hash ^ a) * const
-        pos += 1
-        i -= 1
-    if length - 1 > 2:
-        while pos < length:
-            a = ord(string[pos])
-            b = ord(string[pos+1])
-            c = ord(string[pos+2])
-            d = ord(string[pos+3])
-            hash = ((((hash ^ a) * const ^ b) * const ^ c) * const ^ d) * const
-            pos += 4
+# Maps each event name to its index in the catalog (first occurrence, same as list.index)
+@lru_cache(maxsize=None)
+def load_event_indices():
+    indices = {}
+    for key, names in load_event_list().items():
+        indices[key] = {}
+        for i, name in enumerate(names):
+            indices[key].setdefault(name, i)
+    return MappingProxyType(indices)
 
-    return hash & 0xFFFFFFFF
+# Returns a trace hook that dumps each traced structure as JSON to an open text file (or anything with write())
+def json_trace(sink, indent=4):
+    def trace(name, value):
+        json.dump({name : value}, sink, indent=indent)
+        sink.write("\n")
+    return trace
 
 class BAEV:
-    def __init__(self, data, filename, stream=ReadStream(b''), string_pool=ReadStream(b'')):
+    # trace is an optional callable(name, value) that receives intermediate structures while parsing, off by default
+    def __init__(self, data, filename, stream=None, string_pool=None, trace=None):
         if data:
             self.events = data
         else:
             self.events = {}
         self.filename = filename
-        self.stream = stream
-        self.string_pool = string_pool
-        with open("events.json", "r") as f:
-            self.event_list = json.load(f)
+        self.stream = stream if stream is not None else ReadStream(b'')
+        self.string_pool = string_pool if string_pool is not None else StringPool(b'')
+        self.trace = trace
+
+    @property
+    def event_list(self):
+        return load_event_list()
 
     @classmethod
-    def from_binary(cls, data, filename):
-        assert type(data) in [bytes, bytearray], "Data should be bytes or bytearray"
-        this = cls([], filename, ReadStream(data), ReadStream(data))
+    # data can also be a file path, including virtual paths into archives (Pack/Actor/X.pack.zs::AS/Foo.root.baev)
+    def from_binary(cls, data, filename, trace=None, romfs_path=""):
+        if type(data) == str:
+            from converter import read_file
+            data = read_file(data, romfs_path)
+        assert type(data) in [bytes, bytearray, memoryview], "Data should be bytes, bytearray or memoryview"
+        this = cls([], filename, ReadStream(data), StringPool(data), trace)
         
         header = this.read_file_header()
         this.stream.seek(header["Section Info"][0]["Base Offset"])
@@ -105,9 +135,7 @@ class BAEV:
     # Common BAEV array structure
     def read_array(self, element):
         array = []
-        offset = self.stream.read_u64()
-        count = self.stream.read_u32()
-        size = self.stream.read_u32()
+        offset, count, size = self.stream.read_record(array_format)
         pos = self.stream.tell()
         self.stream.seek(offset)
         for i in range(count):
@@ -126,8 +154,8 @@ class BAEV:
         container["String Pool Offset"] = self.stream.read_u64()
         container["Event Info"] = self.read_array(self.read_node)
         nodes = self.read_array(self.read_event_node)
-        with open('test.json', 'w') as f:
-            json.dump(nodes, f, indent=4)
+        if self.trace is not None:
+            self.trace("Event Nodes", nodes)
         for entry in container["Event Info"]:
             for i in range(len(entry["Nodes"])):
                 entry["Nodes"][i] = nodes[entry["Nodes"][i]]
@@ -135,18 +163,19 @@ class BAEV:
     
     def read_node(self):
         entry = {}
-        entry["Hash"] = "0x%08x" % self.stream.read_u32()
-        padding = self.stream.read_u32()
-        entry["Nodes"] = self.read_array(self.stream.read_u32) # indices
+        hash, padding, offset, count, size = self.stream.read_record(event_info_format)
+        entry["Hash"] = "0x%08x" % hash
+        pos = self.stream.tell()
+        self.stream.seek(offset)
+        entry["Nodes"] = [i[0] for i in self.stream.iter_records("<I", count)] # indices
+        self.stream.seek(pos)
         return entry
     
     def read_event_node(self):
         entry = {}
-        offset = self.stream.read_u64()
-        count = self.stream.read_u32()
-        entry_size = self.stream.read_u32()
-        entry["Hash"] = "0x%08x" % self.stream.read_u32()
-        entry["Unknown"] = self.stream.read_u32()
+        offset, count, entry_size, hash, unknown = self.stream.read_record(event_node_format)
+        entry["Hash"] = "0x%08x" % hash
+        entry["Unknown"] = unknown
         pos = self.stream.tell()
         self.stream.seek(offset)
         entry["Event"] = {}
@@ -172,27 +201,24 @@ class BAEV:
     def read_trigger_event_array(self):
         entry = {}
         entry["Parameters"] = self.read_array(self.read_param_offset)
-        entry["Start Frame"] = self.stream.read_f32()
-        padding = self.stream.read_f32()
+        entry["Start Frame"], padding = self.stream.read_record("<ff")
         return entry
     
     def read_hold_event_array(self):
         entry = {}
         entry["Parameters"] = self.read_array(self.read_param_offset)
-        entry["Start Frame"] = self.stream.read_f32()
-        entry["End Frame"] = self.stream.read_f32()
+        entry["Start Frame"], entry["End Frame"] = self.stream.read_record("<ff")
         return entry
 
     def read_parameter(self):
-        param_type = self.stream.read_u32()
-        padding = self.stream.read_u32()
+        param_type, padding = self.stream.read_record("<II")
         match param_type:
             case 0:
                 parameter = self.stream.read_u32()
             case 1:
                 parameter = self.stream.read_f32()
             case 3:
-                parameter = [self.stream.read_f32(), self.stream.read_f32(), self.stream.read_f32()]
+                parameter = list(self.stream.read_record("<fff"))
             case 5:
                 parameter = self.string_pool.read_string(self.stream.read_u64())
             case _:
@@ -208,11 +234,10 @@ class BAEV:
         self.stream.seek(pos)
         return param
     
-    def to_json(self, output_dir=""):
+    def to_json(self, output_dir="", compact=False):
         if output_dir:
             os.makedirs(output_dir, exist_ok=True)
-        with open(os.path.join(output_dir, self.filename + ".json"), "w", encoding="utf-8") as f:
-            json.dump(self.events, f, indent=4, ensure_ascii=False)
+        jsonio.write_json(self.events, os.path.join(output_dir, self.filename + ".json"), compact)
 
     def calc_offsets(self, buffer):
         offsets = {}
@@ -260,239 +285,247 @@ class BAEV:
         offsets["Size"] = offset + len(buffer._strings)
         return offsets, count
 
-    def to_binary(self, output_dir=""):
-        if output_dir:
-            os.makedirs(output_dir, exist_ok=True)
-        with open(os.path.join(output_dir, self.filename + ".baev"), "wb") as f:
-            buffer = WriteStream(f)
-            buffer.add_string("")
-            offsets, count = self.calc_offsets(buffer)
-            buffer.write("BFFH".encode('utf-8'))
-            buffer.write(u32(offsets["BFFH"]))
-            buffer.write(u32(offsets["Size"])) # file size
-            buffer.write(u32(8)) # alignment
-            buffer.write(u64(offsets["BFSI0"])) # offset for section headers array
-            buffer.write(u32(2)) # section count
-            buffer.write(u32(0x28)) # section header size
-            buffer.write(u64(offsets["Container"])) # data container offset
-            buffer.write("Nintendo.AnimationEvent.ResourceConverter.Resource.AnimationEventArchiveResData".encode('utf-8'))
-            buffer.skip(0x31) # padding bc the meme string is 0x80 bytes
-            buffer.write("BFSI".encode('utf-8'))
-            buffer.write(u32(offsets["Container"])) # section offset
-            buffer.write(u32(offsets["String"] - offsets["Container"])) # section size
-            buffer.write(u32(8)) # section alignment
-            buffer.write(u64(offsets["Container"])) # section pointer
-            buffer.write("Default\x00\x00\x00\x00\x00\x00\x00\x00\x00".encode('utf-8')) # section name string
-            buffer.write("BFSI".encode('utf-8')) # header is the same as the previous one
-            buffer.write(u32(offsets["String"]))
-            buffer.write(u32(len(buffer._strings)))
-            buffer.write(u32(1))
-            buffer.write(u64(offsets["String"]))
-            buffer.write("StringPool\x00\x00\x00\x00\x00\x00".encode('utf-8'))
+    # Serializes the file into an in-memory buffer
+    def to_bytes(self):
+        event_indices = load_event_indices()
+        stream = io.BytesIO()
+        buffer = WriteStream(stream)
+        buffer.add_string("")
+        offsets, count = self.calc_offsets(buffer)
+        buffer.write("BFFH".encode('utf-8'))
+        buffer.write(u32(offsets["BFFH"]))
+        buffer.write(u32(offsets["Size"])) # file size
+        buffer.write(u32(8)) # alignment
+        buffer.write(u64(offsets["BFSI0"])) # offset for section headers array
+        buffer.write(u32(2)) # section count
+        buffer.write(u32(0x28)) # section header size
+        buffer.write(u64(offsets["Container"])) # data container offset
+        buffer.write("Nintendo.AnimationEvent.ResourceConverter.Resource.AnimationEventArchiveResData".encode('utf-8'))
+        buffer.skip(0x31) # padding bc the meme string is 0x80 bytes
+        buffer.write("BFSI".encode('utf-8'))
+        buffer.write(u32(offsets["Container"])) # section offset
+        buffer.write(u32(offsets["String"] - offsets["Container"])) # section size
+        buffer.write(u32(8)) # section alignment
+        buffer.write(u64(offsets["Container"])) # section pointer
+        buffer.write("Default\x00\x00\x00\x00\x00\x00\x00\x00\x00".encode('utf-8')) # section name string
+        buffer.write("BFSI".encode('utf-8')) # header is the same as the previous one
+        buffer.write(u32(offsets["String"]))
+        buffer.write(u32(len(buffer._strings)))
+        buffer.write(u32(1))
+        buffer.write(u64(offsets["String"]))
+        buffer.write("StringPool\x00\x00\x00\x00\x00\x00".encode('utf-8'))
+        buffer.write(u64(0))
+        buffer.write(b'\x00\x00\x01\x00') # version
+        buffer.write(u32(0)) # padding
+        buffer.write(u64(offsets["String"])) # string pool offset
+        if (len(self.events) == 0):
             buffer.write(u64(0))
-            buffer.write(b'\x00\x00\x01\x00') # version
+            buffer.write(u32(0))
+            buffer.write(u32(0))
+        else:
+            buffer.write(u64(offsets["HashHeader"]))
+            buffer.write(u32(len(self.events)))
+            buffer.write(u32(0x18)) # element size
+            
+        if (count == 0):
+            buffer.write(u64(0))
+            buffer.write(u32(0))
+            buffer.write(u32(0))
+        else:
+            buffer.write(u64(offsets["Nodes"]))
+            buffer.write(u32(count))
+            buffer.write(u32(0x18))
+        offset = offsets["Indices"]
+        sorted_events = dict(sorted(self.events.items()))
+        for entry in sorted_events:
+            buffer.write(u32(int(entry, 16)))
             buffer.write(u32(0)) # padding
-            buffer.write(u64(offsets["String"])) # string pool offset
-            if (len(self.events) == 0):
-                buffer.write(u64(0))
-                buffer.write(u32(0))
-                buffer.write(u32(0))
-            else:
-                buffer.write(u64(offsets["HashHeader"]))
-                buffer.write(u32(len(self.events)))
-                buffer.write(u32(0x18)) # element size
-                
-            if (count == 0):
-                buffer.write(u64(0))
-                buffer.write(u32(0))
-                buffer.write(u32(0))
-            else:
-                buffer.write(u64(offsets["Nodes"]))
-                buffer.write(u32(count))
-                buffer.write(u32(0x18))
-            offset = offsets["Indices"]
-            sorted_events = dict(sorted(self.events.items()))
-            for entry in sorted_events:
-                buffer.write(u32(int(entry, 16)))
-                buffer.write(u32(0)) # padding
-                buffer.write(u64(offset))
-                offset += 4 * len(sorted_events[entry])
-                buffer.write(u32(len(sorted_events[entry])))
-                buffer.write(u32(4)) # entry size
-            # ideally we'd want to figure out how these are sorted because this isn't right
-            nodes = []
-            for entry in self.events:
-                for node in self.events[entry]:
-                    nodes.append(node)
-            for entry in sorted_events:
-                for node in sorted_events[entry]:
-                    buffer.write(u32(nodes.index(node)))
-            while buffer.tell() % 8 != 0:
-                buffer.write(u8(0))
-            offset = offsets["Events"]
-            for node in nodes:
-                buffer.write(u64(offset))
-                buffer.write(u32(len(node["Event"])))
-                buffer.write(u32(0x30)) # element size
-                buffer.write(u32(int(node["Hash"], 16)))
-                buffer.write(u32(node["Unknown"]))
-                offset += 0x30 * len(node["Event"])
-                for event in node["Event"]:
-                    if "Trigger Array" in node["Event"][event]:
-                        for trigger in node["Event"][event]["Trigger Array"]:
-                            offset += 0x18
+            buffer.write(u64(offset))
+            offset += 4 * len(sorted_events[entry])
+            buffer.write(u32(len(sorted_events[entry])))
+            buffer.write(u32(4)) # entry size
+        # ideally we'd want to figure out how these are sorted because this isn't right
+        nodes = []
+        for entry in self.events:
+            for node in self.events[entry]:
+                nodes.append(node)
+        node_indices = index_entries(nodes)
+        for entry in sorted_events:
+            for node in sorted_events[entry]:
+                buffer.write(u32(node_indices[freeze(node)]))
+        while buffer.tell() % 8 != 0:
+            buffer.write(u8(0))
+        offset = offsets["Events"]
+        for node in nodes:
+            buffer.write(u64(offset))
+            buffer.write(u32(len(node["Event"])))
+            buffer.write(u32(0x30)) # element size
+            buffer.write(u32(int(node["Hash"], 16)))
+            buffer.write(u32(node["Unknown"]))
+            offset += 0x30 * len(node["Event"])
+            for event in node["Event"]:
+                if "Trigger Array" in node["Event"][event]:
+                    for trigger in node["Event"][event]["Trigger Array"]:
+                        offset += 0x18
+                        for param in trigger["Parameters"]:
+                            offset += 0x8 + (0x18 if type(param) == list else 0x10)
+                if "Hold Array" in node["Event"][event]:
+                    for hold in node["Event"][event]["Hold Array"]:
+                        offset += 0x18
+                        for param in hold["Parameters"]:
+                            offset += 0x8 + (0x18 if type(param) == list else 0x10)
+        for node in nodes:
+            offset = buffer.tell() + 0x30 * len(node["Event"])
+            for event in node["Event"]:
+                buffer.write(u64(buffer._string_refs[event] + offsets["String"]))
+                if "Trigger Array" in node["Event"][event]:
+                    buffer.write(u64(offset))
+                    buffer.write(u32(len(node["Event"][event]["Trigger Array"])))
+                    buffer.write(u32(0x18))
+                    offset += 0x18 * len(node["Event"][event]["Trigger Array"])
+                else:
+                    buffer.write(u64(0))
+                    buffer.write(u32(0))
+                    buffer.write(u32(0))
+                if "Hold Array" in node["Event"][event]:
+                    buffer.write(u64(offset))
+                    buffer.write(u32(len(node["Event"][event]["Hold Array"])))
+                    buffer.write(u32(0x18))
+                    offset += 0x18 * len(node["Event"][event]["Hold Array"])
+                else:
+                    buffer.write(u64(0))
+                    buffer.write(u32(0))
+                    buffer.write(u32(0))
+                buffer.write(u32(1 if "Hold Array" in node["Event"][event] else 0))
+                if "Trigger Array" in node["Event"][event]:
+                    buffer.write(u32(event_indices["Trigger"][event]))
+                elif "Hold Array" in node["Event"][event]:
+                    buffer.write(u32(event_indices["Hold"][event]))
+                elif event in event_indices["Trigger"]:
+                    buffer.write(u32(event_indices["Trigger"][event]))
+                elif event in event_indices["Hold"]:
+                    buffer.write(u32(event_indices["Hold"][event]))
+                else:
+                    buffer.write(u32(0))
+            for event in node["Event"]:
+                if "Trigger Array" in node["Event"][event]:
+                    for trigger in node["Event"][event]["Trigger Array"]:
+                        if trigger["Parameters"] != []:
+                            buffer.write(u64(offset))
+                            offset += 8 * len(trigger["Parameters"])
+                        else:
+                            buffer.write(u64(0))
+                        buffer.write(u32(len(trigger["Parameters"])))
+                        has_vec = False
+                        for param in trigger["Parameters"]:
+                            if type(param) == list:
+                                has_vec = True
+                                break
+                        if has_vec:
+                            buffer.write(u32(0x10))
+                        else:
+                            buffer.write(u32(0x8))
+                        buffer.write(f32(trigger["Start Frame"]))
+                        buffer.write(f32(0))
+                if "Hold Array" in node["Event"][event]:
+                    for hold in node["Event"][event]["Hold Array"]:
+                        if hold["Parameters"] != []:
+                            buffer.write(u64(offset))
+                            offset += 8 * len(hold["Parameters"])
+                        else:
+                            buffer.write(u64(0))
+                        buffer.write(u32(len(hold["Parameters"])))
+                        has_vec = False
+                        for param in hold["Parameters"]:
+                            if type(param) == list:
+                                has_vec = True
+                                break
+                        if has_vec:
+                            buffer.write(u32(0x10))
+                        else:
+                            buffer.write(u32(0x8))
+                        buffer.write(f32(hold["Start Frame"]))
+                        buffer.write(f32(hold["End Frame"]))
+            offset = buffer.tell()
+            for event in node["Event"]:
+                if "Trigger Array" in node["Event"][event]:
+                    for trigger in node["Event"][event]["Trigger Array"]:
+                        offset += 8 * len(trigger["Parameters"])
+                if "Hold Array" in node["Event"][event]:
+                    for hold in node["Event"][event]["Hold Array"]:
+                        offset += 8 * len(hold["Parameters"])
+            for event in node["Event"]:
+                if "Trigger Array" in node["Event"][event]:
+                    for trigger in node["Event"][event]["Trigger Array"]:
+                        if trigger["Parameters"]:
                             for param in trigger["Parameters"]:
-                                offset += 0x8 + (0x18 if type(param) == list else 0x10)
-                    if "Hold Array" in node["Event"][event]:
-                        for hold in node["Event"][event]["Hold Array"]:
-                            offset += 0x18
-                            for param in hold["Parameters"]:
-                                offset += 0x8 + (0x18 if type(param) == list else 0x10)
-            for node in nodes:
-                offset = buffer.tell() + 0x30 * len(node["Event"])
-                for event in node["Event"]:
-                    buffer.write(u64(buffer._string_refs[event] + offsets["String"]))
-                    if "Trigger Array" in node["Event"][event]:
-                        buffer.write(u64(offset))
-                        buffer.write(u32(len(node["Event"][event]["Trigger Array"])))
-                        buffer.write(u32(0x18))
-                        offset += 0x18 * len(node["Event"][event]["Trigger Array"])
-                    else:
-                        buffer.write(u64(0))
-                        buffer.write(u32(0))
-                        buffer.write(u32(0))
-                    if "Hold Array" in node["Event"][event]:
-                        buffer.write(u64(offset))
-                        buffer.write(u32(len(node["Event"][event]["Hold Array"])))
-                        buffer.write(u32(0x18))
-                        offset += 0x18 * len(node["Event"][event]["Hold Array"])
-                    else:
-                        buffer.write(u64(0))
-                        buffer.write(u32(0))
-                        buffer.write(u32(0))
-                    buffer.write(u32(1 if "Hold Array" in node["Event"][event] else 0))
-                    if "Trigger Array" in node["Event"][event]:
-                        buffer.write(u32(self.event_list["Trigger"].index(event)))
-                    elif "Hold Array" in node["Event"][event]:
-                        buffer.write(u32(self.event_list["Hold"].index(event)))
-                    elif event in self.event_list["Trigger"]:
-                        buffer.write(u32(self.event_list["Trigger"].index(event)))
-                    elif event in self.event_list["Hold"]:
-                        buffer.write(u32(self.event_list["Hold"].index(event)))
-                    else:
-                        buffer.write(u32(0))
-                for event in node["Event"]:
-                    if "Trigger Array" in node["Event"][event]:
-                        for trigger in node["Event"][event]["Trigger Array"]:
-                            if trigger["Parameters"] != []:
                                 buffer.write(u64(offset))
-                                offset += 8 * len(trigger["Parameters"])
-                            else:
-                                buffer.write(u64(0))
-                            buffer.write(u32(len(trigger["Parameters"])))
-                            has_vec = False
-                            for param in trigger["Parameters"]:
-                                if type(param) == list:
-                                    has_vec = True
-                                    break
-                            if has_vec:
-                                buffer.write(u32(0x10))
-                            else:
-                                buffer.write(u32(0x8))
-                            buffer.write(f32(trigger["Start Frame"]))
-                            buffer.write(f32(0))
-                    if "Hold Array" in node["Event"][event]:
-                        for hold in node["Event"][event]["Hold Array"]:
-                            if hold["Parameters"] != []:
+                                offset += 0x18 if type(param) == list else 0x10
+                if "Hold Array" in node["Event"][event]:
+                    for hold in node["Event"][event]["Hold Array"]:
+                        if hold["Parameters"]:
+                            for param in hold["Parameters"]:
                                 buffer.write(u64(offset))
-                                offset += 8 * len(hold["Parameters"])
+                                offset += 0x18 if type(param) == list else 0x10
+            for event in node["Event"]:
+                if "Trigger Array" in node["Event"][event]:
+                    for trigger in node["Event"][event]["Trigger Array"]:
+                        for param in trigger["Parameters"]:
+                            if type(param) == int:
+                                buffer.write(u32(0))
+                                buffer.write(u32(0))
+                                buffer.write(u32(param))
+                                buffer.write(u32(0))
+                            elif type(param) == float:
+                                buffer.write(u32(1))
+                                buffer.write(u32(0))
+                                buffer.write(f32(param))
+                                buffer.write(u32(0))
+                            elif type(param) == list:
+                                buffer.write(u32(3))
+                                buffer.write(u32(0))
+                                buffer.write(f32(param[0]))
+                                buffer.write(f32(param[1]))
+                                buffer.write(f32(param[2]))
+                                buffer.write(u32(0))
+                            elif type(param) == str:
+                                buffer.write(u32(5))
+                                buffer.write(u32(0))
+                                buffer.write(u64(buffer._string_refs[param] + offsets["String"]))
                             else:
-                                buffer.write(u64(0))
-                            buffer.write(u32(len(hold["Parameters"])))
-                            has_vec = False
-                            for param in hold["Parameters"]:
-                                if type(param) == list:
-                                    has_vec = True
-                                    break
-                            if has_vec:
-                                buffer.write(u32(0x10))
+                                raise ValueError("Invalid Parameter Type")
+                if "Hold Array" in node["Event"][event]:
+                    for hold in node["Event"][event]["Hold Array"]:
+                        for param in hold["Parameters"]:
+                            if type(param) == int:
+                                buffer.write(u32(0))
+                                buffer.write(u32(0))
+                                buffer.write(u32(param))
+                                buffer.write(u32(0))
+                            elif type(param) == float:
+                                buffer.write(u32(1))
+                                buffer.write(u32(0))
+                                buffer.write(f32(param))
+                                buffer.write(u32(0))
+                            elif type(param) == list:
+                                buffer.write(u32(3))
+                                buffer.write(u32(0))
+                                buffer.write(f32(param[0]))
+                                buffer.write(f32(param[1]))
+                                buffer.write(f32(param[2]))
+                                buffer.write(u32(0))
+                            elif type(param) == str:
+                                buffer.write(u32(5))
+                                buffer.write(u32(0))
+                                buffer.write(u64(buffer._string_refs[param] + offsets["String"]))
                             else:
-                                buffer.write(u32(0x8))
-                            buffer.write(f32(hold["Start Frame"]))
-                            buffer.write(f32(hold["End Frame"]))
-                offset = buffer.tell()
-                for event in node["Event"]:
-                    if "Trigger Array" in node["Event"][event]:
-                        for trigger in node["Event"][event]["Trigger Array"]:
-                            offset += 8 * len(trigger["Parameters"])
-                    if "Hold Array" in node["Event"][event]:
-                        for hold in node["Event"][event]["Hold Array"]:
-                            offset += 8 * len(hold["Parameters"])
-                for event in node["Event"]:
-                    if "Trigger Array" in node["Event"][event]:
-                        for trigger in node["Event"][event]["Trigger Array"]:
-                            if trigger["Parameters"]:
-                                for param in trigger["Parameters"]:
-                                    buffer.write(u64(offset))
-                                    offset += 0x18 if type(param) == list else 0x10
-                    if "Hold Array" in node["Event"][event]:
-                        for hold in node["Event"][event]["Hold Array"]:
-                            if hold["Parameters"]:
-                                for param in hold["Parameters"]:
-                                    buffer.write(u64(offset))
-                                    offset += 0x18 if type(param) == list else 0x10
-                for event in node["Event"]:
-                    if "Trigger Array" in node["Event"][event]:
-                        for trigger in node["Event"][event]["Trigger Array"]:
-                            for param in trigger["Parameters"]:
-                                if type(param) == int:
-                                    buffer.write(u32(0))
-                                    buffer.write(u32(0))
-                                    buffer.write(u32(param))
-                                    buffer.write(u32(0))
-                                elif type(param) == float:
-                                    buffer.write(u32(1))
-                                    buffer.write(u32(0))
-                                    buffer.write(f32(param))
-                                    buffer.write(u32(0))
-                                elif type(param) == list:
-                                    buffer.write(u32(3))
-                                    buffer.write(u32(0))
-                                    buffer.write(f32(param[0]))
-                                    buffer.write(f32(param[1]))
-                                    buffer.write(f32(param[2]))
-                                    buffer.write(u32(0))
-                                elif type(param) == str:
-                                    buffer.write(u32(5))
-                                    buffer.write(u32(0))
-                                    buffer.write(u64(buffer._string_refs[param] + offsets["String"]))
-                                else:
-                                    raise ValueError("Invalid Parameter Type")
-                    if "Hold Array" in node["Event"][event]:
-                        for hold in node["Event"][event]["Hold Array"]:
-                            for param in hold["Parameters"]:
-                                if type(param) == int:
-                                    buffer.write(u32(0))
-                                    buffer.write(u32(0))
-                                    buffer.write(u32(param))
-                                    buffer.write(u32(0))
-                                elif type(param) == float:
-                                    buffer.write(u32(1))
-                                    buffer.write(u32(0))
-                                    buffer.write(f32(param))
-                                    buffer.write(u32(0))
-                                elif type(param) == list:
-                                    buffer.write(u32(3))
-                                    buffer.write(u32(0))
-                                    buffer.write(f32(param[0]))
-                                    buffer.write(f32(param[1]))
-                                    buffer.write(f32(param[2]))
-                                    buffer.write(u32(0))
-                                elif type(param) == str:
-                                    buffer.write(u32(5))
-                                    buffer.write(u32(0))
-                                    buffer.write(u64(buffer._string_refs[param] + offsets["String"]))
-                                else:
-                                    raise ValueError("Invalid Parameter Type")
-            assert buffer.tell() == offsets["String"], f"{hex(buffer.tell())}, expected {hex(offsets['String'])}"
-            buffer.write(buffer._strings)
\ No newline at end of file
+                                raise ValueError("Invalid Parameter Type")
+        assert buffer.tell() == offsets["String"], f"{hex(buffer.tell())}, expected {hex(offsets['String'])}"
+        buffer.write(buffer._strings)
+        return stream.getvalue()
+
+    def to_binary(self, output_dir=""):
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        with open(os.path.join(output_dir, self.filename + ".baev"), "wb") as f:
+            f.write(self.to_bytes())
\ No newline at end of file
@@ -10,20 +10,34 @@ try:
     from baev import *
 except ImportError:
     raise ImportError("baev.py not found")
+try:
+    import jsonio
+except ImportError:
+    raise ImportError("jsonio.py not found")
 
 import os
+import re
+import mmap
+import time
+import threading
+import traceback
 from pathlib import Path
-from functools import lru_cache
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 
-@lru_cache
-def get_ctx(romfs_path):
-    if not os.path.exists("romfs.txt"):
-        raise FileNotFoundError("Provide a RomFS path")
+# Virtual paths point to a file inside an archive, e.g. Pack/Actor/X.pack.zs::AS/Foo.root.asb
+ARCHIVE_SEPARATOR = "::"
+ARCHIVE_CACHE_SIZE = 8
+
+# "" uses the RomFS path saved in romfs.txt, contexts are shared per ZsDic file through zstd.get_context
+def get_ctx(romfs_path=""):
     if romfs_path == "":
+        if not os.path.exists("romfs.txt"):
+            raise FileNotFoundError("Provide a RomFS path")
         romfs_path = Path("romfs.txt").read_text("utf-8")
         if romfs_path == "":
             raise ValueError("Provide a RomFS path")
-    return ZstdDecompContext(os.path.join(romfs_path, "Pack/ZsDic.pack.zs"))
+    return get_context(os.path.join(romfs_path, "Pack/ZsDic.pack.zs"))
 
 def decompress(filepath, romfs_path):
     return get_ctx(romfs_path).decompress(filepath)
@@ -31,73 +45,215 @@ def decompress(filepath, romfs_path):
 def compress(filepath, romfs_path=""):
     return get_ctx(romfs_path).compress(filepath)
 
+# ASB and BAEV files both use the generic zs dictionary
+# level is the zstd compression level (1-22), None uses the default
+def compress_bytes(data, romfs_path="", kind="zs", level=None):
+    return get_ctx(romfs_path).compress_bytes(data, kind, level)
+
+# The dictionary is picked from the frame header if kind isn't provided
+def decompress_bytes(data, romfs_path="", kind=None):
+    return get_ctx(romfs_path).decompress_bytes(data, kind)
+
+# Recently used archives are kept open, keyed by their resolved path and modification time
+# Each entry is (archive, mapped buffer), the lock makes the cache safe to use from several threads
+# Archives are closed when they're evicted so one returned by open_archive is only valid until ARCHIVE_CACHE_SIZE other
+# archives have been opened, read_file reads the member while holding the lock so it's always safe
+# The lock is only held to look up and update the cache, packs are decompressed and opened outside it so a slow one
+# doesn't block other threads (two threads opening the same pack at once both open it and the second copy is dropped)
+open_archives = OrderedDict()
+open_archives_lock = threading.RLock()
+
+def open_archive(pack_path, romfs_path=""):
+    stat = os.stat(pack_path)
+    key = (os.path.normcase(os.path.realpath(pack_path)), stat.st_mtime_ns, stat.st_size)
+    with open_archives_lock:
+        if key in open_archives:
+            open_archives.move_to_end(key)
+            return open_archives[key][0]
+    if pack_path.endswith(".zs") or pack_path.endswith(".zstd"):
+        data = get_ctx(romfs_path).decompress_to_mmap(pack_path, "pack")
+    else:
+        with open(pack_path, "rb") as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    entry = (open_sarc(data, os.path.basename(pack_path)), data)
+    evicted = []
+    with open_archives_lock:
+        if key in open_archives:
+            evicted.append(entry)
+            open_archives.move_to_end(key)
+            entry = open_archives[key]
+        else:
+            open_archives[key] = entry
+            while len(open_archives) > ARCHIVE_CACHE_SIZE:
+                evicted.append(open_archives.popitem(last=False)[1])
+    for item in evicted:
+        close_archive(*item)
+    return entry[0]
+
+# Members that are still referenced (e.g. by a parsed file) keep the mapping alive, it's freed once they're gone instead
+def close_archive(archive, data):
+    try:
+        if hasattr(archive, "close"):
+            archive.close()
+        if isinstance(data, mmap.mmap):
+            data.close()
+    except BufferError:
+        pass
+
+def close_archives():
+    with open_archives_lock:
+        entries = list(open_archives.values())
+        open_archives.clear()
+    for entry in entries:
+        close_archive(*entry)
+
+# Reads a loose file or a virtual path into an archive, decompressing it if needed
+# Archive members are returned as memoryviews into the archive when they aren't compressed
+def read_file(filepath, romfs_path=""):
+    if ARCHIVE_SEPARATOR in filepath:
+        pack_path, name = filepath.split(ARCHIVE_SEPARATOR, 1)
+        # retried if the archive gets evicted by another thread before the member is read
+        while True:
+            archive = open_archive(pack_path, romfs_path)
+            with open_archives_lock:
+                if any(entry[0] is archive for entry in open_archives.values()):
+                    data = get_sarc_file(archive, name)
+                    break
+        if data is None:
+            raise FileNotFoundError(f"{name} not found in {pack_path}")
+        if name.endswith(".zs") or name.endswith(".zstd"):
+            return decompress_bytes(data, romfs_path)
+        return data
+    if filepath.endswith(".zs") or filepath.endswith(".zstd"):
+        return decompress(filepath, romfs_path)
+    return Path(filepath).read_bytes()
+
 # the baev file here needs to be a AsNode baev file and not an Animation one
-def asb_to_json(filepath, output_dir="", romfs_path="", baev_path=""):
+# compact=True writes unindented JSON, which is much smaller and faster to write and read back
+def asb_to_json(filepath, output_dir="", romfs_path="", baev_path="", compact=False):
     if romfs_path != "":
         with open("romfs.txt", "w", encoding="utf-8") as f:
             f.write(romfs_path)
-    if filepath.endswith(".zs") or filepath.endswith(".zstd"):
-        data = decompress(filepath, romfs_path)
-    else:
-        data = Path(filepath).read_bytes()
-    file = ASB.from_binary(data)
+    file = ASB.from_binary(read_file(filepath, romfs_path))
     if baev_path != "":
-        if baev_path.endswith(".zs") or baev_path.endswith(".zstd"):
-            file.import_baev(decompress(baev_path, romfs_path))
-        elif baev_path.endswith(".baev"):
-            file.import_baev(Path(baev_path).read_bytes())
+        if ARCHIVE_SEPARATOR in baev_path or baev_path.endswith((".zs", ".zstd", ".baev")):
+            file.import_baev(read_file(baev_path, romfs_path))
         else:
-            file.import_baev(json.loads(Path(baev_path).read_text("utf-8")))
+            file.import_baev(jsonio.read_json(baev_path))
     if output_dir != "":
         os.makedirs(output_dir, exist_ok=True)
-    file.to_json(output_dir)
+    file.to_json(output_dir, compact)
 
-def json_to_asb(filepath, output_dir="", compress_file=False, romfs_path=""):
+def json_to_asb(filepath, output_dir="", compress_file=False, romfs_path="", level=None):
     if romfs_path != "":
         with open("romfs.txt", "w", encoding="utf-8") as f:
             f.write(romfs_path)
-    file = ASB.from_dict(json.loads(Path(filepath).read_text("utf-8")))
+    file = ASB.from_dict(jsonio.read_json(filepath))
     if output_dir != "":
         os.makedirs(output_dir, exist_ok=True)
     if compress_file:
-        file.to_binary()
-        data = compress(file.filename + ".asb", romfs_path)
+        data = compress_bytes(file.to_bytes(), romfs_path, level=level)
         with open(os.path.join(output_dir, file.filename + ".asb.zs"), "wb") as f:
             f.write(data)
-        os.remove(file.filename + ".asb")
-        if os.path.exists(file.filename + ".baev"):
-            data = compress(file.filename + ".baev", romfs_path)
+        anim_events = file.export_baev()
+        if anim_events is not None:
+            data = compress_bytes(anim_events.to_bytes(), romfs_path, level=level)
             with open(os.path.join(output_dir, file.filename + ".baev.zs"), "wb") as f:
                 f.write(data)
-            os.remove(file.filename + ".baev")
     else:
         file.to_binary(output_dir)
 
-def baev_to_json(filepath, output_dir="", romfs_path=""):
+def baev_to_json(filepath, output_dir="", romfs_path="", compact=False):
     if romfs_path != "":
         with open("romfs.txt", "w", encoding="utf-8") as f:
             f.write(romfs_path)
-    if filepath.endswith(".zs") or filepath.endswith(".zstd"):
-        data = decompress(filepath, romfs_path)
-    else:
-        data = Path(filepath).read_bytes()
-    file = BAEV.from_binary(data, os.path.basename(filepath).replace(".baev", "").replace(".zs", ""))
+    file = BAEV.from_binary(read_file(filepath, romfs_path), os.path.basename(filepath).replace(".baev", "").replace(".zs", ""))
     if output_dir != "":
         os.makedirs(output_dir, exist_ok=True)
-    file.to_json(output_dir)
+    file.to_json(output_dir, compact)
 
-def json_to_baev(filepath, output_dir="", compress_file=False, romfs_path=""):
+def json_to_baev(filepath, output_dir="", compress_file=False, romfs_path="", level=None):
     if romfs_path != "":
         with open("romfs.txt", "w", encoding="utf-8") as f:
             f.write(romfs_path)
-    file = BAEV.from_dict(json.loads(Path(filepath).read_text("utf-8")), os.path.basename(filepath).replace(".json", ""))
+    file = BAEV.from_dict(jsonio.read_json(filepath), os.path.basename(filepath).replace(".json", ""))
     if output_dir != "":
         os.makedirs(output_dir, exist_ok=True)
     if compress_file:
-        file.to_binary()
-        data = compress(file.filename + ".baev", romfs_path)
+        data = compress_bytes(file.to_bytes(), romfs_path, level=level)
         with open(os.path.join(output_dir, file.filename + ".baev.zs"), "wb") as f:
             f.write(data)
-        os.remove(file.filename + ".baev")
     else:
-        file.to_binary(output_dir)
\ No newline at end of file
+        file.to_binary(output_dir)
+# Source file extensions handled by each conversion direction
+# ASB and BAEV JSON files are both named <name>.json so JSON sources are also checked against json_signatures
+converters = {
+    "asb_to_json" : (asb_to_json, (".asb", ".asb.zs")),
+    "json_to_asb" : (json_to_asb, (".json",)),
+    "baev_to_json" : (baev_to_json, (".baev", ".baev.zs")),
+    "json_to_baev" : (json_to_baev, (".json",)),
+}
+
+# What the start of a JSON file written by asb_to_json/baev_to_json looks like (ASB files start with their metadata,
+# BAEV files are keyed by hashes), other JSON files in the folder are skipped
+json_signatures = {
+    "json_to_asb" : re.compile(rb'\s*\{\s*"Metadata"\s*:'),
+    "json_to_baev" : re.compile(rb'\s*\{\s*(\}|"0x[0-9a-fA-F]+"\s*:)'),
+}
+JSON_SIGNATURE_SIZE = 0x40
+
+def matches_signature(direction, filepath):
+    if direction not in json_signatures:
+        return True
+    try:
+        with open(filepath, "rb") as f:
+            start = f.read(JSON_SIGNATURE_SIZE)
+    except OSError:
+        return True # let the conversion report the error
+    return json_signatures[direction].match(start.removeprefix(b"\xef\xbb\xbf")) is not None
+
+# Runs a single conversion and reports how long it took and why it failed (if it did)
+# Each worker process keeps its own ZstdDecompContext through get_ctx
+def convert_file(direction, filepath, output_dir, compress_file=False, level=None, compact=False):
+    start = time.perf_counter()
+    try:
+        if direction.startswith("json_to"):
+            converters[direction][0](filepath, output_dir, compress_file, level=level)
+        else:
+            converters[direction][0](filepath, output_dir, compact=compact)
+        error = None
+    except Exception:
+        error = traceback.format_exc()
+    return {"Path" : filepath, "Time" : time.perf_counter() - start, "Error" : error}
+
+# Converts every matching file under src (e.g. a RomFS AnimationSequence folder) into the same layout under dst
+# workers=None uses one process per CPU, workers=1 converts everything in the current process
+# Returns a result dict per file, a failed file (or a crashed worker) doesn't stop the rest of the batch
+def convert_tree(src, dst, direction, workers=None, compress_file=False, romfs_path="", level=None, compact=False):
+    if direction not in converters:
+        raise ValueError(f"Invalid conversion direction: {direction}, expected one of {list(converters)}")
+    if romfs_path != "":
+        # Written once up front so the workers don't race on it
+        with open("romfs.txt", "w", encoding="utf-8") as f:
+            f.write(romfs_path)
+    extensions = converters[direction][1]
+    jobs = []
+    for root, dirs, files in os.walk(src):
+        output_dir = os.path.join(dst, os.path.relpath(root, src))
+        for name in sorted(files):
+            filepath = os.path.join(root, name)
+            if name.endswith(extensions) and matches_signature(direction, filepath):
+                jobs.append((filepath, output_dir))
+    for output_dir in {job[1] for job in jobs}:
+        os.makedirs(output_dir, exist_ok=True)
+    if workers == 1:
+        return [convert_file(direction, filepath, output_dir, compress_file, level, compact) for filepath, output_dir in jobs]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(convert_file, direction, filepath, output_dir, compress_file, level, compact) for filepath, output_dir in jobs]
+        results = []
+        for (filepath, output_dir), future in zip(jobs, futures):
+            try:
+                results.append(future.result())
+            except Exception: # the worker died (BrokenProcessPool) or the result couldn't be sent back
+                results.append({"Path" : filepath, "Time" : 0.0, "Error" : traceback.format_exc()})
+        return results
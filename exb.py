@@ -85,9 +85,8 @@ class EXB:
             self.parameter_region_offset = self.stream.read_u32()
             string_offset = self.stream.read_u32()
 
-            # String pool (slice extends until end of file but it doesn't matter)
-            self.stream.seek(string_offset)
-            self.string_pool = ReadStream(self.stream.read())
+            # String pool (extends until end of file but it doesn't matter)
+            self.string_pool = StringPool(data, string_offset)
 
             # Signature offsets
             self.stream.seek(signature_table_offset)
@@ -202,7 +201,7 @@ class EXB:
                 if instruction[f"{i} Source"] == "ParamTblStr":
                     jumpback = self.stream.tell()
                     self.stream.seek(self.parameter_region_offset + instruction[f"{i} Index/Value"])
-                    instruction[f"{i} Value"] = self.string_pool.read_string()
+                    instruction[f"{i} Value"] = self.string_pool.read_string(self.stream.read_u32())
                     self.stream.seek(jumpback)
                 if instruction[f"{i} Source"] == "Imm":
                     instruction[f"{i} Value"] = instruction[f"{i} Index/Value"]
@@ -282,6 +281,7 @@ class EXB:
         command_start = buffer.tell()
         buffer.write(u32(len(exb.instructions)))
         signature_offsets = []
+        signature_indices = {} # Maps string offsets to their index in the signature table
         for instruction in exb.instructions:
             if instruction["Type"] != "Terminator":
                 for key in instruction:
@@ -297,9 +297,11 @@ class EXB:
                         buffer.write(u16(instruction[key]))
                     elif key == "Signature":
                         buffer.add_string_exb(instruction[key])
-                        if buffer._string_refs_exb[instruction[key]] not in signature_offsets:
-                            signature_offsets.append(buffer._string_refs_exb[instruction[key]])
-                        buffer.write(u32(signature_offsets.index(buffer._string_refs_exb[instruction[key]])))
+                        string_offset = buffer._string_refs_exb[instruction[key]]
+                        if string_offset not in signature_indices:
+                            signature_indices[string_offset] = len(signature_offsets)
+                            signature_offsets.append(string_offset)
+                        buffer.write(u32(signature_indices[string_offset]))
             else:
                 buffer.write(u8(1))
                 buffer.skip(7)
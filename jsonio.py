@@ -0,0 +1,120 @@
+# JSON reading/writing with an optional fast backend
+# orjson or msgspec are used when installed, the stdlib json module is used otherwise and whenever the fast backend
+# can't represent the data exactly (NaN/inf floats, huge ints, NaN/Infinity tokens written by the stdlib...)
+import io
+import os
+import json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+# Errors that make loads() retry with the stdlib
+decode_errors = (ValueError, TypeError) if msgspec is None else (ValueError, TypeError, msgspec.DecodeError)
+
+INDENT = 4
+
+# Set the ASB_JSON_BACKEND environment variable to json, orjson or msgspec to pick one
+def available_backends():
+    backends = []
+    if orjson is not None:
+        backends.append("orjson")
+    if msgspec is not None:
+        backends.append("msgspec")
+    backends.append("json")
+    return backends
+
+def set_backend(name):
+    global backend
+    if name not in available_backends():
+        raise ValueError(f"JSON backend {name} is not available, expected one of {available_backends()}")
+    backend = name
+
+backend = os.environ.get("ASB_JSON_BACKEND") or available_backends()[0]
+if backend not in available_backends():
+    backend = "json"
+
+# NaN and +-inf (x - x is only 0 for finite floats)
+def has_non_finite(obj):
+    todo = [obj]
+    while todo:
+        value = todo.pop()
+        for item in (value.values() if isinstance(value, dict) else value):
+            kind = type(item)
+            if kind is str or kind is int or kind is bool or item is None:
+                continue
+            if kind is float:
+                if item - item:
+                    return True
+            elif isinstance(item, (dict, list, tuple)):
+                todo.append(item)
+    return False
+
+# Returns None if the fast backend can't be used for this object
+def fast_dumps(obj):
+    try:
+        if backend == "orjson":
+            data = orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+        elif backend == "msgspec":
+            data = msgspec.json.encode(obj)
+        else:
+            return None
+    except (TypeError, ValueError, OverflowError):
+        return None
+    # both write NaN and inf as null, the stdlib keeps them so values always round trip
+    # output without any null can't have lost one so the object is only checked otherwise
+    if b"null" in data and has_non_finite(obj):
+        return None
+    return data
+
+# Pretty output always comes from the stdlib so the files look the same regardless of which backend is installed
+def dumps(obj, compact=False):
+    data = fast_dumps(obj) if compact else None
+    if data is None:
+        if compact:
+            data = json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+        else:
+            data = json.dumps(obj, indent=INDENT, ensure_ascii=False).encode("utf-8")
+    return data
+
+# fp is a binary file handle, the stdlib output is streamed into it instead of being built as one string
+def dump(obj, fp, compact=False):
+    data = fast_dumps(obj) if compact else None
+    if data is not None:
+        fp.write(data)
+        return
+    writer = io.TextIOWrapper(fp, encoding="utf-8")
+    try:
+        if compact:
+            json.dump(obj, writer, separators=(",", ":"), ensure_ascii=False)
+        else:
+            json.dump(obj, writer, indent=INDENT, ensure_ascii=False)
+        writer.flush()
+    finally:
+        writer.detach() # leave fp open for the caller, even if the write failed
+
+# data can be bytes or str
+def loads(data):
+    try:
+        if backend == "orjson":
+            return orjson.loads(data)
+        if backend == "msgspec":
+            return msgspec.json.decode(data)
+    except decode_errors:
+        pass # let the stdlib decode it (or raise the usual json error)
+    return json.loads(data)
+
+def load(fp):
+    return loads(fp.read())
+
+def read_json(path):
+    with open(path, "rb") as f:
+        return load(f)
+
+def write_json(obj, path, compact=False):
+    with open(path, "wb") as f:
+        dump(obj, f, compact)
@@ -0,0 +1,169 @@
+# Optional typed object model for parsed ASB files
+# Nodes, node bodies, commands and calc controllers get a __slots__ class each, every other fixed-layout dict
+# (parameters, child links, sync controls, events...) gets a slotted class per distinct key layout
+# Records support the same item access as the dicts they replace and asdict() converts them back for JSON
+import re
+
+# Connections shared by every node body, always after the type-specific fields
+connection_fields = ["Child Nodes", "State Connections", "State Transitions", "Events", "Frame Controls"]
+
+node_fields = ["Node Index", "Node Type", "No State Transition", "Tags", "GUID", "ASMarking",
+               "Sync Controls", "Calc Controllers", "Body", "BAEV Events"]
+
+command_fields = ["Name", "Tags", "Unknown 1", "Ignore Same Command", "Interpolation Type", "GUID", "Node Index"]
+
+calc_ctrl_fields = ["Parameter", "Adjust Value", "Calc Mode", "Default Value", "Adjust Rate", "Base Result", "Min", "Max", "Select Flag"]
+
+body_fields = {
+    "FloatSelector" : ["Parameter", "Is Sync", "Force Run"],
+    "StringSelector" : ["Parameter", "Is Sync", "Force Run"],
+    "SkeletalAnimation" : ["Animation", "Unknown 1", "Unknown 2", "Unknown 3", "Unknown 4"],
+    "State" : [],
+    "OneDimensionalBlender" : ["Parameter", "Lerp Mode"],
+    "Sequential" : ["Use Sync Range Mult", "Sync Range Mult", "Unknown 3"],
+    "IntSelector" : ["Parameter", "Is Sync", "Force Run"],
+    "Simultaneous" : ["Finish With Child"],
+    "Event" : ["Event"],
+    "MaterialAnimation" : ["Material Blend Setting", "Animation", "Is Loop"],
+    "FrameController" : ["Animation Rate", "Start Frame", "End Frame", "Loop Flags", "Loop Cancel Flag", "Unknown 2",
+                         "Loop Num", "Max Random Loop Num", "Is Not Use Random Bonus Loop", "Animation Freeze Point",
+                         "Animation Freeze Frame", "Loop Duration", "Is Include Initial Loop", "Unknown 10",
+                         "Unknown 11", "Unknown 12", "Unknown 13"],
+    "DummyAnimation" : ["Frame", "Is Loop"],
+    "RandomSelector" : ["Select Flag", "Is Sync", "Max Cached Select Count", "Force Run"],
+    "PreviousTagSelector" : ["Tag Set Index"],
+    "BonePositionSelector" : ["Bone 1", "Bone 2", "Axis", "Select Flag", "Is Sync"],
+    "BoneAnimation" : ["Animation", "Is Loop", "Unknown 2", "Unknown 3"],
+    "InitialFrame" : ["Calc Mode", "Tags", "Unknown 1", "Bone 1", "Bone 2", "Axis", "Calc Loop", "Exclude Random Loops"],
+    "BoneBlender" : ["Bone Group Name", "Unknown 1", "Blend Rate", "Unknown 3", "Unknown 4"],
+    "BoolSelector" : ["Parameter", "Is Sync", "Force Run"],
+    "Alert" : ["Message"],
+    "SubtractAnimation" : [],
+    "ShapeAnimation" : ["Animation"],
+    "Unknown7" : [],
+}
+
+# Values under these keys are keyed by arbitrary names (e.g. BAEV event names) so they're left as they are
+opaque_keys = {"BAEV Events"}
+
+# "Is Include Initial Loop" -> is_include_initial_loop
+def attr_name(key):
+    name = re.sub(r"\W+", "_", key.strip()).lower()
+    return "_" + name if name[:1].isdigit() else name
+
+class Record:
+    __slots__ = ()
+    fields = () # dict keys in output order
+    key_attrs = {}
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, self.key_attrs[key])
+        except (KeyError, AttributeError):
+            raise KeyError(key) from None
+
+    def __setitem__(self, key, value):
+        if key not in self.key_attrs:
+            raise KeyError(f"{type(self).__name__} has no field {key!r}")
+        setattr(self, self.key_attrs[key], value)
+
+    def __contains__(self, key):
+        return key in self.key_attrs and hasattr(self, self.key_attrs[key])
+
+    def get(self, key, default=None):
+        return getattr(self, self.key_attrs[key], default) if key in self.key_attrs else default
+
+    def keys(self):
+        return [key for key in self.fields if hasattr(self, self.key_attrs[key])]
+
+    def items(self):
+        return [(key, getattr(self, self.key_attrs[key])) for key in self.keys()]
+
+    def asdict(self):
+        return {key : to_dict(value) for key, value in self.items()}
+
+    def __eq__(self, other):
+        if isinstance(other, (Record, dict)):
+            return to_dict(self) == to_dict(other)
+        return NotImplemented
+
+    def __repr__(self):
+        return f"{type(self).__name__}({', '.join(f'{self.key_attrs[key]}={value!r}' for key, value in self.items())})"
+
+def make_record(name, fields):
+    attrs = [attr_name(key) for key in fields]
+    return type(name, (Record,), {"__slots__" : tuple(attrs), "fields" : tuple(fields), "key_attrs" : dict(zip(fields, attrs))})
+
+Node = make_record("Node", node_fields)
+Command = make_record("Command", command_fields)
+CalcController = make_record("CalcController", calc_ctrl_fields)
+body_types = {name : make_record(name + "Body", fields + connection_fields) for name, fields in body_fields.items()}
+
+# Classes for every other key layout, created on first use
+record_shapes = {}
+
+def shape_record(keys):
+    if keys not in record_shapes:
+        attrs = [attr_name(key) for key in keys]
+        # Keys that don't map to distinct attribute names stay as dicts
+        record_shapes[keys] = make_record("Record", keys) if len(set(attrs)) == len(attrs) and all(attrs) else None
+    return record_shapes[keys]
+
+# Only use a declared class if the dict's keys appear in the same order as its fields so asdict() round trips exactly
+fits_cache = {}
+
+def fits(cls, keys):
+    if (cls, keys) not in fits_cache:
+        fields = iter(cls.fields)
+        fits_cache[(cls, keys)] = all(key in fields for key in keys)
+    return fits_cache[(cls, keys)]
+
+# Lists under these keys hold records of a known class
+item_types = {"Calc Controllers" : CalcController}
+
+def convert_field(parent, key, item, memo):
+    if key in opaque_keys:
+        return item
+    if key == "Body":
+        return to_records(item, body_types.get(parent.get("Node Type")), memo)
+    return to_records(item, item_types.get(key), memo, key in item_types)
+
+# Converts nested dicts into records, shared dicts and lists stay shared (memo is keyed by id)
+# cls is the preferred class for value (or for its items if items is set)
+def to_records(value, cls=None, memo=None, items=False):
+    if memo is None:
+        memo = {}
+    if id(value) in memo:
+        return memo[id(value)][1]
+    if isinstance(value, list):
+        record = [to_records(item, cls if items else None, memo) for item in value]
+    elif isinstance(value, dict):
+        keys = tuple(value)
+        if cls is None or not fits(cls, keys):
+            cls = shape_record(keys)
+        if cls is None:
+            record = {key : convert_field(value, key, item, memo) for key, item in value.items()}
+        else:
+            record = cls.__new__(cls)
+            for key, item in value.items():
+                setattr(record, cls.key_attrs[key], convert_field(value, key, item, memo))
+    else:
+        return value
+    memo[id(value)] = (value, record) # the source is kept alive so its id isn't reused during the conversion
+    return record
+
+def to_node(node, memo=None):
+    return to_records(node, Node, memo)
+
+def to_command(command, memo=None):
+    return to_records(command, Command, memo)
+
+# Converts records back into plain dicts/lists
+def to_dict(value):
+    if isinstance(value, Record):
+        return value.asdict()
+    if isinstance(value, list):
+        return [to_dict(item) for item in value]
+    if isinstance(value, dict):
+        return {key : to_dict(item) for key, item in value.items()}
+    return value
@@ -0,0 +1,106 @@
+# Edits made through the typed model have to end up in the written file
+# Run from the repository root with python -m unittest discover tests
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from asb import ASB
+
+def guid(i):
+    return "%08x-0000-0000-0000-000000000000" % (0x1000 + i)
+
+def blackboard_ref(index, type="float"):
+    return {"Blackboard Index": index, "Type": type, "Select Flag": "NoSelectOnUpdate"}
+
+def calc_ctrl():
+    return {"Parameter": {"Blackboard Index": 0, "Type": "float"}, "Adjust Value": 1.0, "Calc Mode": "Degrees",
+            "Default Value": 0.5, "Adjust Rate": 1.0, "Base Result": 0.0, "Min": 0.0, "Max": 10.0}
+
+def make_file():
+    transition = {"Current Node": 0, "Target Node": 1, "Check Type": "CheckState",
+                  "Transition to Next Instead of Target": False, "Skip Transition": True, "Unknown": 0,
+                  "Parameters": [{"Compare Type": "Equals", "Value 1": 1.0, "Value 2": blackboard_ref(0)},
+                                 {"Compare Type": "GreaterThan", "Value 1": 3, "Value 2": 4},
+                                 {"Compare Type": "NotEquals", "Value 1": "abc", "Value 2": "def"},
+                                 {"Compare Type": "GreaterThan"}]}
+    event = {"Trigger Events": [{"Name": "Trig", "Unknown": 0, "Hash": "0x12345678", "Start Frame": 1.0, "Parameters": [1.5]}],
+             "Hold Events": [{"Name": "Hold", "Unknown": 1, "Hash": "0x87654321", "Start Frame": 1.0, "End Frame": 3.0,
+                              "Parameters": [2]}]}
+    nodes = [
+        {"Node Index": 0, "Node Type": "State", "No State Transition": False, "Tags": ["A"], "GUID": guid(0),
+         "ASMarking": ["ASMarking", "Mark", "Mark2"], "Sync Controls": [{"GUID": guid(100), "Fade In Frame": 1.0, "Unknown": 0}],
+         "Body": {"Child Nodes": [1], "State Transitions": [{"State Transition": transition, "Node Index": 1}]}},
+        {"Node Index": 1, "Node Type": "SkeletalAnimation", "No State Transition": False, "GUID": guid(1),
+         "Body": {"Animation": "Wait", "Unknown 1": 0, "Unknown 2": 1, "Unknown 3": False, "Unknown 4": 0.0,
+                  "Events": [2], "Frame Controls": [3]}},
+        {"Node Index": 2, "Node Type": "Event", "No State Transition": False, "GUID": guid(2), "Body": {"Event": event}},
+        {"Node Index": 3, "Node Type": "FrameController", "No State Transition": False, "GUID": guid(3),
+         "Calc Controllers": [calc_ctrl()],
+         "Body": {"Animation Rate": calc_ctrl(), "Start Frame": 0.0, "End Frame": blackboard_ref(0), "Loop Flags": 0,
+                  "Loop Cancel Flag": False, "Unknown 2": False, "Loop Num": 1, "Max Random Loop Num": 0,
+                  "Is Not Use Random Bonus Loop": False, "Animation Freeze Point": 0.0, "Animation Freeze Frame": 0.0,
+                  "Loop Duration": 0.0, "Is Include Initial Loop": True, "Unknown 10": 0.0, "Unknown 11": False,
+                  "Unknown 12": 0, "Unknown 13": 0}},
+        {"Node Index": 4, "Node Type": "MaterialAnimation", "No State Transition": False, "GUID": guid(4),
+         "Body": {"Material Blend Setting": {"Name": "mb", "Blend Start": 0.5}, "Animation": "Mat", "Is Loop": True}},
+    ]
+    data = {
+        "Metadata": {"Filename": "Typed", "Version": "0x417", "HasASNodeBaev": False},
+        "Blackboard": {"string": [{"Name": "s", "Init Value": "str"}], "int": [{"Name": "i", "Init Value": 2, "Reference File": "Foo/Bar.bgparamlist"}],
+                       "float": [{"Name": "f", "Init Value": 1.0}, {"Name": "f2", "Init Value": 2.0}],
+                       "bool": [{"Name": "b", "Init Value": True}], "vec3f": [{"Name": "v", "Init Value": [1.0, 2.0, 3.0]}]},
+        "Bone Groups": [],
+        "Expressions": [],
+        "Partials": [],
+        "Transitions": [{"Unknown": 0, "Transitions": [{"Current Command": "Cmd", "Next Command": "Cmd", "Parameter Type": "float",
+                                                        "Allow Multiple Matches": False, "Parameter": "p", "Value": 1.0}]}],
+        "Valid Tags": ["A"],
+        "Commands": [{"Name": "Cmd", "Tags": ["A"], "Unknown 1": 0.0, "Ignore Same Command": False,
+                      "Interpolation Type": 0, "GUID": guid(200), "Node Index": 0}],
+        "Nodes": nodes,
+    }
+    return ASB.from_dict(data).to_bytes()
+
+class TypedWriteTest(unittest.TestCase):
+    def test_unedited_round_trip(self):
+        data = make_file()
+        self.assertEqual(ASB.from_binary(data, typed=True).to_bytes(), data)
+
+    def test_edits_are_written(self):
+        file = ASB.from_binary(make_file(), typed=True)
+        file.commands[0]["Interpolation Type"] = 2
+        file.nodes[0]["Tags"] = ["B"]
+        file.nodes[0]["ASMarking"] = ["ASMarking", "Edited", "Mark2"]
+        file.nodes[0]["Sync Controls"][0]["Fade In Frame"] = 7.0
+        file.nodes[0]["Body"]["State Transitions"][0]["State Transition"]["Parameters"][0]["Value 1"] = 5.0
+        file.nodes[1]["Body"]["Animation"] = "Run"
+        file.nodes[2]["Body"]["Event"]["Trigger Events"][0]["Start Frame"] = 42.0
+        file.nodes[2]["Body"]["Event"]["Hold Events"][0]["End Frame"] = 9.0
+        file.nodes[3]["Calc Controllers"][0]["Max"] = 99.0
+        file.nodes[3]["Body"]["End Frame"]["Blackboard Index"] = 1
+        file.nodes[4]["Body"]["Material Blend Setting"]["Blend Start"] = 0.25
+
+        parsed = ASB.from_binary(file.to_bytes())
+        self.assertEqual(parsed.asdict(), file.asdict())
+        nodes = parsed.nodes
+        self.assertEqual(parsed.commands[0]["Interpolation Type"], 2)
+        self.assertEqual(nodes[0]["Tags"], ["B"])
+        self.assertEqual(nodes[0]["ASMarking"], ["ASMarking", "Edited", "Mark2"])
+        self.assertEqual(nodes[0]["Sync Controls"][0]["Fade In Frame"], 7.0)
+        self.assertEqual(nodes[0]["Body"]["State Transitions"][0]["State Transition"]["Parameters"][0]["Value 1"], 5.0)
+        self.assertEqual(nodes[1]["Body"]["Animation"], "Run")
+        self.assertEqual(nodes[2]["Body"]["Event"]["Trigger Events"][0]["Start Frame"], 42.0)
+        self.assertEqual(nodes[2]["Body"]["Event"]["Hold Events"][0]["End Frame"], 9.0)
+        self.assertEqual(nodes[3]["Calc Controllers"][0]["Max"], 99.0)
+        self.assertEqual(nodes[3]["Body"]["End Frame"]["Blackboard Index"], 1)
+        self.assertEqual(nodes[4]["Body"]["Material Blend Setting"]["Blend Start"], 0.25)
+
+    def test_section_lists_are_dropped(self):
+        file = ASB.from_binary(make_file(), typed=True)
+        for name in ["calc_ctrl", "events", "sync_ctrl", "as_markings", "state_transitions", "material_blend"]:
+            self.assertEqual(getattr(file, name), [], name)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,13 +1,64 @@
 # Largely adapated from https://github.com/zeldamods/evfl
 import struct
 import io
+from functools import lru_cache
 
 def get_string(data, offset):
-    if type(data) != bytes:
+    if not hasattr(data, "find"): # streams are read from their current position
         data = data.read()
     end = data.find(b'\x00', offset)
     return data[offset:end].decode('utf-8')
 
+# Converts nested dicts/lists into an equivalent hashable form (dict key order doesn't matter, same as ==)
+def freeze(value):
+    if isinstance(value, dict):
+        return frozenset((k, freeze(v)) for k, v in value.items())
+    if isinstance(value, list):
+        return tuple(freeze(v) for v in value)
+    return value
+
+# Maps the frozen form of each entry to the index of its first occurrence (same result as list.index)
+def index_entries(entries):
+    indices = {}
+    for i, entry in enumerate(entries):
+        indices.setdefault(freeze(entry), i)
+    return indices
+
+# Wraps the file buffer once and memoizes decoded strings by their offset relative to the pool start
+# If the pool size is known, every string is split out in a single pass up front
+class StringPool:
+    __slots__ = ["data", "base", "_view", "_cache"]
+
+    def __init__(self, data, base=0, size=None) -> None:
+        if type(data) == memoryview:
+            data = data.obj if hasattr(data.obj, "find") and data.nbytes == len(data.obj) else data.tobytes()
+        self.data = data
+        self.base = base
+        self._view = memoryview(data)
+        self._cache = {}
+        if size is not None:
+            self.split(size)
+
+    def split(self, size) -> None:
+        offset = 0
+        chunks = bytes(self._view[self.base:self.base + size]).split(b'\x00')
+        for chunk in chunks[:-1]: # anything after the last null terminator isn't a complete string
+            if offset not in self._cache:
+                self._cache[offset] = chunk.decode('utf-8')
+            offset += len(chunk) + 1
+
+    def read_string(self, offset) -> str:
+        try:
+            return self._cache[offset]
+        except KeyError:
+            start = self.base + offset
+            end = self.data.find(b'\x00', start)
+            if end < 0:
+                end = len(self.data)
+            string = str(self._view[start:end], 'utf-8')
+            self._cache[offset] = string
+            return string
+
 class Stream:
     __slots__ = ["stream"]
 
@@ -23,61 +74,119 @@ class Stream:
     def skip(self, skip_size) -> None:
         self.stream.seek(skip_size, 1)
 
-class ReadStream(Stream):
+# Struct objects are compiled once per format and shared by every reader
+@lru_cache(maxsize=None)
+def get_struct(fmt) -> struct.Struct:
+    if fmt[:1] not in "<>!=@":
+        fmt = "<" + fmt # default to little endian without native alignment
+    return struct.Struct(fmt)
+
+def _endian_structs(code):
+    return {"<": struct.Struct("<" + code), ">": struct.Struct(">" + code)}
+
+_u8 = _endian_structs("B")
+_u16 = _endian_structs("H")
+_s16 = _endian_structs("h")
+_u32 = _endian_structs("I")
+_s32 = _endian_structs("i")
+_u64 = _endian_structs("Q")
+_s64 = _endian_structs("q")
+_f32 = _endian_structs("f")
+_f64 = _endian_structs("d")
+
+class ReadStream:
+    __slots__ = ["data", "_view", "pos"]
+
     def __init__(self, data) -> None:
-        stream = io.BytesIO(memoryview(data))
-        super().__init__(stream)
         self.data = data
+        self._view = memoryview(data).cast("B")
+        self.pos = 0
+
+    def seek(self, offset, whence=io.SEEK_SET) -> None:
+        if whence == io.SEEK_CUR:
+            offset += self.pos
+        elif whence == io.SEEK_END:
+            offset += len(self._view)
+        if offset < 0:
+            raise ValueError(f"Negative seek position {offset}")
+        self.pos = offset
+
+    def tell(self) -> int:
+        return self.pos
+
+    def skip(self, skip_size) -> None:
+        self.pos += skip_size
+
+    def read(self, size=-1) -> bytes:
+        start = self.pos
+        if size is None or size < 0:
+            end = len(self._view)
+        else:
+            end = min(start + size, len(self._view))
+        self.pos = max(start, end)
+        return bytes(self._view[start:end])
+
+    def _unpack(self, fmt: struct.Struct):
+        value = fmt.unpack_from(self._view, self.pos)[0]
+        self.pos += fmt.size
+        return value
+
+    # Decodes a fixed-layout record in one call and returns it as a tuple
+    def read_record(self, fmt) -> tuple:
+        fmt = get_struct(fmt)
+        record = fmt.unpack_from(self._view, self.pos)
+        self.pos += fmt.size
+        return record
+
+    # Decodes a table of count consecutive records, the cursor is moved past the table immediately
+    def iter_records(self, fmt, count):
+        fmt = get_struct(fmt)
+        start = self.pos
+        end = start + fmt.size * count
+        if end > len(self._view):
+            raise struct.error(f"iter_records requires a buffer of {end - start} bytes at {hex(start)}")
+        self.pos = end
+        return fmt.iter_unpack(self._view[start:end])
 
-    def read(self, *args) -> bytes:
-        return self.stream.read(*args)
-    
     def read_u8(self, end="<") -> int:
-        return struct.unpack(f"{end}B", self.read(1))[0]
+        return self._unpack(_u8[end])
     
     def read_u16(self, end="<") -> int:
-        return struct.unpack(f"{end}H", self.read(2))[0]
+        return self._unpack(_u16[end])
     
     def read_s16(self, end="<") -> int:
-        return struct.unpack(f"{end}h", self.read(2))[0]
+        return self._unpack(_s16[end])
     
     def read_u24(self, end="<") -> int:
-        if end == "<":
-            return struct.unpack(f"{end}I", self.read(3) + b'\x00')[0]
-        else:
-            return struct.unpack(f"{end}I", b'\x00' + self.read(3))[0]
+        return int.from_bytes(self.read_record("3s")[0], "little" if end == "<" else "big")
         
     def read_s24(self, end="<") -> int:
-        if end == "<":
-            return struct.unpack(f"{end}i", self.read(3) + b'\x00')[0]
-        else:
-            return struct.unpack(f"{end}i", b'\x00' + self.read(3))[0]
+        return int.from_bytes(self.read_record("3s")[0], "little" if end == "<" else "big", signed=True)
     
     def read_u32(self, end="<") -> int:
-        return struct.unpack(f"{end}I", self.read(4))[0]
+        return self._unpack(_u32[end])
     
     def read_s32(self, end="<") -> int:
-        return struct.unpack(f"{end}i", self.read(4))[0]
+        return self._unpack(_s32[end])
     
     def read_u64(self, end="<") -> int:
-        return struct.unpack(f"{end}Q", self.read(8))[0]
+        return self._unpack(_u64[end])
     
     def read_s64(self, end="<") -> int:
-        return struct.unpack(f"{end}q", self.read(8))[0]
+        return self._unpack(_s64[end])
     
     def read_ptr(self, align=8, end="<") -> int:
-        while self.stream.tell() % align != 0:
-            self.read(1)
-        return struct.unpack(f"{end}Q", self.read(8))[0]
+        self.pos += -self.pos % align
+        return self._unpack(_u64[end])
     
     def read_f32(self, end="<") -> float:
-        return struct.unpack(f"{end}f", self.read(4))[0]
+        return self._unpack(_f32[end])
     
     def read_f64(self, end="<") -> float:
-        return struct.unpack(f"{end}d", self.read(4))[0]
+        return self._unpack(_f64[end])
 
     def read_string(self, offset=None, size=4): # Data should be a slice beginning at the string pool
-        pos = self.stream.tell()
+        pos = self.pos
         if offset == None:
             if size == 4:
                 ptr = self.read_u32()
@@ -89,17 +198,29 @@ class ReadStream(Stream):
                 raise Exception("Please provide relative offset for other data sizes")
         else:
             ptr = offset
-        string = get_string(self.stream, ptr)
-        self.stream.seek(pos)
+        string = str(self._view[ptr:self._find_null(ptr)], 'utf-8')
+        self.pos = pos
         return string
 
+    # Buffers without find() (memoryviews) are searched in growing windows so only a little past the string is copied
+    def _find_null(self, start) -> int:
+        if hasattr(self.data, "find"):
+            end = self.data.find(b'\x00', start)
+            return end if end >= 0 else len(self._view)
+        window = 0x100
+        while start < len(self._view):
+            end = bytes(self._view[start:start + window]).find(b'\x00')
+            if end >= 0:
+                return start + end
+            start += window
+            window = min(window * 2, 0x10000)
+        return len(self._view)
+
     def read_string_sarc(self):
-        string = b''
-        current_char = self.stream.read(1)
-        while current_char != b'\x00':
-            string += current_char
-            current_char = self.stream.read(1)
-        return string.decode('utf-8')
+        end = self._find_null(self.pos)
+        string = str(self._view[self.pos:end], 'utf-8')
+        self.pos = min(end + 1, len(self._view))
+        return string
     
 class PlaceholderWriter:
     __slots__ = ["_offset"]
@@ -116,30 +237,25 @@ class PlaceholderWriter:
 class WriteStream(Stream):
     def __init__(self, stream):
         super().__init__(stream)
-        self._string_list = [] # List of strings in file
-        self._strings = b'' # String pool to write to file
-        self._string_refs = {} # Maps strings to relative offsets
-        self._string_list_exb = [] # List of strings in file
-        self._strings_exb = b'' # String pool to write to file
+        self._strings = bytearray() # String pool to write to file
+        self._string_refs = {} # Maps strings to relative offsets (also serves as the membership test)
+        self._strings_exb = bytearray() # String pool to write to file
         self._string_refs_exb = {} # Maps strings to relative offsets
 
-    def add_string(self, string):
-        if string not in self._string_list:
+    @staticmethod
+    def _intern(string, refs, pool):
+        if string not in refs:
             encoded = string.encode()
-            self._string_list.append(string)
-            self._string_refs[string] = len(self._strings)
-            self._strings += encoded
+            refs[string] = len(pool)
+            pool += encoded
             if encoded[-1:] != b'\x00': # All strings must end with a null termination character
-                self._strings += b'\x00'
+                pool += b'\x00'
+
+    def add_string(self, string):
+        self._intern(string, self._string_refs, self._strings)
 
     def add_string_exb(self, string):
-        if string not in self._string_list_exb:
-            encoded = string.encode()
-            self._string_list_exb.append(string)
-            self._string_refs_exb[string] = len(self._strings_exb)
-            self._strings_exb += encoded
-            if encoded[-1:] != b'\x00': # All strings must end with a null termination character
-                self._strings_exb += b'\x00'
+        self._intern(string, self._string_refs_exb, self._strings_exb)
 
     def write(self, data):
         self.stream.write(data)
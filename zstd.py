@@ -11,59 +11,324 @@ except ImportError:
         import sarc
     except ImportError:
         raise ImportError("sarc.py not found")
-from functools import lru_cache
 from pathlib import Path
 from typing import Dict, List
 import sys
+import os
+import mmap
+import shutil
+import tempfile
+import threading
+import time
+import hashlib
+import struct
+from concurrent.futures import ThreadPoolExecutor
+
+ZSTD_MAGIC: bytes = b"\x28\xb5\x2f\xfd"
+ZSTD_FRAME_HEADER_MAX: int = 18
+STREAM_CHUNK_SIZE: int = 0x100000
+DEFAULT_LEVEL: int = 3
+DICT_CACHE_MAGIC: bytes = b"ZDIC"
+DICT_NAMES: Dict[str, str] = {"pack" : "pack.zsdic", "bcett" : "bcett.byml.zsdic", "zs" : "zs.zsdic"}
+MAX_LEVEL: int = zstd.MAX_COMPRESSION_LEVEL
+
+# These wrap the zstandard objects instead of subclassing them, zstandard's types free their instances without untracking
+# them from the garbage collector so freeing a subclass instance (e.g. when a thread's decompressors go away) can crash
+# Every other attribute is passed through to the wrapped object
+class ZstdDecompressor:
+    __slots__ = ["decompressor"]
 
-class ZstdDecompressor(zstd.ZstdDecompressor):
     def __init__(self, dictionary: zstd.ZstdCompressionDict=None, format: int=zstd.FORMAT_ZSTD1) -> None:
-        super().__init__(dict_data=dictionary, format=format)
+        self.decompressor: zstd.ZstdDecompressor = zstd.ZstdDecompressor(dict_data=dictionary, format=format)
+
+    def __getattr__(self, name: str):
+        return getattr(self.decompressor, name)
 
     def _decompress(self, data: bytes) -> bytes:
-        return self.decompress(data)
+        return self.decompressor.decompress(data)
     
-class ZstdCompressor(zstd.ZstdCompressor):
-    def __init__(self, dictionary: zstd.ZstdCompressionDict=None) -> None:
-        super().__init__(dict_data=dictionary)
+# level ranges from 1 (fastest) to 22 (smallest), threads=-1 uses every core for a single frame
+class ZstdCompressor:
+    __slots__ = ["compressor"]
+
+    def __init__(self, dictionary: zstd.ZstdCompressionDict=None, level: int=DEFAULT_LEVEL, threads: int=0) -> None:
+        self.compressor: zstd.ZstdCompressor = zstd.ZstdCompressor(dict_data=dictionary, level=level, threads=threads)
+
+    def __getattr__(self, name: str):
+        return getattr(self.compressor, name)
     
     def _compress(self, data: bytes) -> bytes:
-        return self.compress(data)
+        return self.compressor.compress(data)
+
+# Wraps a decompressed SARC buffer with oead if it's available or the lazy pure Python reader otherwise
+def open_sarc(data, filename: str=""):
+    if "oead" in sys.modules:
+        return oead.Sarc(data)
+    return sarc.LazySarc(data, filename)
+
+# Returns the member's data without copying it, or None if the archive doesn't contain it
+def get_sarc_file(archive, name: str):
+    if "oead" in sys.modules:
+        file = archive.get_file(name)
+        return None if file is None else file.data
+    return archive.get(name)
+
+# Extracted dictionaries are cached here so new processes don't have to unpack ZsDic.pack.zs again
+# Set ASB_CACHE_DIR to change the location or to an empty string to disable the cache
+def get_cache_dir() -> str:
+    if "ASB_CACHE_DIR" in os.environ:
+        return os.environ["ASB_CACHE_DIR"]
+    if sys.platform == "win32":
+        base: str = os.environ.get("LOCALAPPDATA", os.path.expanduser("~"))
+    elif sys.platform == "darwin":
+        base: str = os.path.expanduser("~/Library/Caches")
+    else:
+        base: str = os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache"))
+    return os.path.join(base, "asb")
+
+# The cache entry is keyed by the ZsDic location as well as its modification time and size
+def get_cache_path(zsdic_pack_path: str) -> str:
+    cache_dir: str = get_cache_dir()
+    if not cache_dir:
+        return ""
+    stat: os.stat_result = os.stat(zsdic_pack_path)
+    key: str = f"{os.path.normcase(os.path.abspath(zsdic_pack_path))}|{stat.st_mtime_ns}|{stat.st_size}"
+    return os.path.join(cache_dir, f"zsdic-{hashlib.sha1(key.encode('utf-8')).hexdigest()}.bin")
+
+# Cache format: magic, dictionary count, then a u16 name length, name, u32 data size and data per dictionary
+def pack_dictionaries(dictionaries: Dict[str, bytes]) -> bytes:
+    buffer: bytearray = bytearray(DICT_CACHE_MAGIC + struct.pack("<I", len(dictionaries)))
+    for name, data in dictionaries.items():
+        encoded: bytes = name.encode("utf-8")
+        buffer += struct.pack("<H", len(encoded)) + encoded + struct.pack("<I", len(data)) + data
+    return bytes(buffer)
+
+def unpack_dictionaries(data: bytes) -> Dict[str, bytes]:
+    if data[:4] != DICT_CACHE_MAGIC:
+        raise ValueError("Invalid dictionary cache magic")
+    count: int = struct.unpack_from("<I", data, 4)[0]
+    pos: int = 8
+    dictionaries: Dict[str, bytes] = {}
+    for i in range(count):
+        name_size: int = struct.unpack_from("<H", data, pos)[0]
+        name: str = data[pos + 2:pos + 2 + name_size].decode("utf-8")
+        pos += 2 + name_size
+        size: int = struct.unpack_from("<I", data, pos)[0]
+        dictionaries[name] = data[pos + 4:pos + 4 + size]
+        if len(dictionaries[name]) != size:
+            raise ValueError("Truncated dictionary cache")
+        pos += 4 + size
+    return dictionaries
 
+# Raw dictionary data from ZsDic.pack.zs (or the cache if it's still current)
+def load_dictionaries(zsdic_pack_path: str) -> Dict[str, bytes]:
+    cache_path: str = get_cache_path(zsdic_pack_path)
+    if cache_path and os.path.isfile(cache_path):
+        try:
+            return unpack_dictionaries(Path(cache_path).read_bytes())
+        except (OSError, ValueError, struct.error):
+            pass # rebuild a stale or corrupted entry
+    vanilla_decompressor: zstd.ZstdDecompressor = zstd.ZstdDecompressor()
+    if "oead" in sys.modules:
+        archive: oead.Sarc = oead.Sarc(vanilla_decompressor.decompress(Path(zsdic_pack_path).read_bytes()))
+        dictionaries: Dict[str, bytes] = {f.name: bytes(f.data) for f in archive.get_files()}
+    else:
+        archive: sarc.Sarc = sarc.Sarc(vanilla_decompressor.decompress(Path(zsdic_pack_path).read_bytes()))
+        dictionaries: Dict[str, bytes] = {i["Name"] : bytes(i["Data"]) for i in archive.files}
+    if cache_path:
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            # Written to a temporary file first so concurrent processes never see a partial entry
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(cache_path))
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(pack_dictionaries(dictionaries))
+                os.replace(tmp_path, cache_path)
+            finally:
+                if os.path.exists(tmp_path): # only left behind if the write or the rename failed
+                    os.remove(tmp_path)
+        except OSError:
+            pass # the cache is only an optimization
+    return dictionaries
+
+# Decompressors and compressors are only created the first time they're needed
+# zstandard objects can't be used from several threads at once so each thread gets its own (the context itself is shared)
+# Use get_context() rather than constructing this directly so each ZsDic is only loaded once per process
 class ZstdDecompContext:
-    @lru_cache
     def __init__(self, zsdic_pack_path: str="") -> None:
-        vanilla_decompressor: zstd.ZstdDecompressor = zstd.ZstdDecompressor()
-        if "oead" in sys.modules:
-            archive: oead.Sarc = oead.Sarc(vanilla_decompressor.decompress(Path(zsdic_pack_path).read_bytes()))
-            dictionaries: Dict[str, zstd.ZstdCompressionDict] = {f.name: zstd.ZstdCompressionDict(f.data) for f in archive.get_files()}
-        else:
-            archive: sarc.Sarc = sarc.Sarc(vanilla_decompressor.decompress(Path(zsdic_pack_path).read_bytes()))
-            dictionaries: Dict[str, zstd.ZstdCompressionDict] = {i["Name"] : zstd.ZstdCompressionDict(i["Data"]) for i in archive.files}
-        self.pack: ZstdDecompressor = ZstdDecompressor(dictionaries["pack.zsdic"])
-        self.bcett: ZstdDecompressor = ZstdDecompressor(dictionaries["bcett.byml.zsdic"])
-        self.zs: ZstdDecompressor = ZstdDecompressor(dictionaries["zs.zsdic"])
-        self.mc: ZstdDecompressor = ZstdDecompressor(format=zstd.FORMAT_ZSTD1_MAGICLESS)
-        self.pack_compress: ZstdCompressor = ZstdCompressor(dictionaries["pack.zsdic"])
-        self.bcett_compress: ZstdCompressor = ZstdCompressor(dictionaries["bcett.byml.zsdic"])
-        self.zs_compress: ZstdCompressor = ZstdCompressor(dictionaries["zs.zsdic"])
-    
-    def decompress(self, filepath: str) -> bytes:
-        if not(filepath.endswith(".zs") or filepath.endswith(".zstd")):
-            return Path(filepath).read_bytes()
+        start: float = time.perf_counter()
+        self.path: str = zsdic_pack_path
+        self.dictionaries: Dict[str, zstd.ZstdCompressionDict] = {
+            name: zstd.ZstdCompressionDict(data) for name, data in load_dictionaries(zsdic_pack_path).items()
+        }
+        # zstandard digests a dictionary for decompression the first time it's used and doesn't lock while doing it,
+        # so it's done here once instead of racing (and crashing) when several threads start decompressing at once
+        for dictionary in self.dictionaries.values():
+            ZstdDecompressor(dictionary).decompressobj()
+        # Frames record the ID of the dictionary they were compressed with
+        self.dict_kinds: Dict[int, str] = {
+            self.dictionaries[DICT_NAMES[kind]].dict_id(): kind for kind in DICT_NAMES
+        }
+        # Compression dictionaries precomputed for a level, keyed by (dictionary name, level)
+        # A precomputed dictionary fixes the compression parameters so each level gets its own
+        self.compress_dictionaries: Dict[tuple, zstd.ZstdCompressionDict] = {}
+        self.local: threading.local = threading.local()
+        self.lock: threading.Lock = threading.Lock()
+        self.build_time: float = time.perf_counter() - start
+
+    # Kept for compatibility with the old eagerly built attributes
+    pack = property(lambda self: self.get_decompressor("pack"))
+    bcett = property(lambda self: self.get_decompressor("bcett"))
+    zs = property(lambda self: self.get_decompressor("zs"))
+    mc = property(lambda self: self.get_decompressor("mc"))
+    vanilla = property(lambda self: self.get_decompressor("none"))
+    pack_compress = property(lambda self: self.get_compressor("pack"))
+    bcett_compress = property(lambda self: self.get_compressor("bcett"))
+    zs_compress = property(lambda self: self.get_compressor("zs"))
+
+    # Per-thread caches
+    @property
+    def decompressors(self) -> Dict[str, ZstdDecompressor]:
+        if not hasattr(self.local, "decompressors"):
+            self.local.decompressors = {}
+        return self.local.decompressors
+
+    @property
+    def compressors(self) -> Dict[tuple, ZstdCompressor]:
+        if not hasattr(self.local, "compressors"):
+            self.local.compressors = {}
+        return self.local.compressors
+
+    # Dictionary kind used for a file, based on its extension
+    @staticmethod
+    def get_kind(filepath: str) -> str:
         if filepath.endswith(".pack.zs"):
-            return self.pack._decompress(Path(filepath).read_bytes())
+            return "pack"
         elif filepath.endswith(".bcett.byml.zs"):
-            return self.bcett._decompress(Path(filepath).read_bytes())
+            return "bcett"
         elif filepath.endswith(".mc"):
-            return self.mc._decompress(Path(filepath).read_bytes())
+            return "mc"
         else:
-            return self.zs._decompress(Path(filepath).read_bytes())
+            return "zs"
+
+    # Dictionary kind used for a compressed buffer, based on its frame header
+    def detect_kind(self, data: bytes) -> str:
+        if bytes(data[:4]) != ZSTD_MAGIC:
+            return "mc"
+        dict_id: int = zstd.get_frame_parameters(data).dict_id
+        if dict_id == 0:
+            return "none"
+        if dict_id not in self.dict_kinds:
+            raise ValueError(f"Unknown zstd dictionary ID {dict_id:#x}")
+        return self.dict_kinds[dict_id]
+
+    def make_decompressor(self, kind: str) -> ZstdDecompressor:
+        if kind in DICT_NAMES:
+            return ZstdDecompressor(self.dictionaries[DICT_NAMES[kind]])
+        elif kind == "mc":
+            return ZstdDecompressor(format=zstd.FORMAT_ZSTD1_MAGICLESS)
+        elif kind == "none":
+            return ZstdDecompressor()
+        raise ValueError(f"Invalid zstd kind: {kind}")
+
+    # Returns this thread's decompressor, creation is locked since the dictionaries are shared between threads
+    def get_decompressor(self, kind: str) -> ZstdDecompressor:
+        decompressors: Dict[str, ZstdDecompressor] = self.decompressors
+        if kind not in decompressors:
+            with self.lock:
+                decompressors[kind] = self.make_decompressor(kind)
+        return decompressors[kind]
+
+    # kind is one of pack, bcett, zs, mc or none (plain zstd), detected from the frame if not provided
+    def decompress_bytes(self, data: bytes, kind: str=None) -> bytes:
+        if kind is None:
+            kind = self.detect_kind(data)
+        return self.get_decompressor(kind)._decompress(data)
+
+    # Decompresses a file in chunks into an anonymous temporary file and maps it read-only
+    # Only the chunk being decompressed is held in memory, the mapped pages are backed by the temporary file
+    def decompress_to_mmap(self, filepath: str, kind: str=None):
+        with open(filepath, "rb") as f:
+            if kind is None:
+                kind = self.detect_kind(f.read(ZSTD_FRAME_HEADER_MAX))
+                f.seek(0)
+            with tempfile.TemporaryFile() as out:
+                with self.get_decompressor(kind).stream_reader(f, read_size=STREAM_CHUNK_SIZE) as reader:
+                    shutil.copyfileobj(reader, out, STREAM_CHUNK_SIZE)
+                if out.tell() == 0:
+                    return b''
+                out.flush()
+                return mmap.mmap(out.fileno(), 0, access=mmap.ACCESS_READ)
+
+    # Opens a .pack.zs archive without holding the whole decompressed archive in memory
+    # The members are read from the mapped file as they're accessed
+    def open_pack(self, filepath: str):
+        return open_sarc(self.decompress_to_mmap(filepath, "pack"), os.path.basename(filepath))
+
+    # Shared by every thread's compressors, a precomputed dictionary is only read while compressing
+    def get_compress_dictionary(self, name: str, level: int) -> zstd.ZstdCompressionDict:
+        key: tuple = (name, level)
+        if key not in self.compress_dictionaries:
+            dictionary: zstd.ZstdCompressionDict = zstd.ZstdCompressionDict(self.dictionaries[name].as_bytes())
+            dictionary.precompute_compress(level=level or DEFAULT_LEVEL) # 0 is zstd's default level
+            self.compress_dictionaries[key] = dictionary
+        return self.compress_dictionaries[key]
+
+    # Called with the lock held
+    def make_compressor(self, kind: str="zs", level: int=DEFAULT_LEVEL, threads: int=0) -> ZstdCompressor:
+        if kind not in DICT_NAMES:
+            raise ValueError(f"Invalid zstd kind for compression: {kind}")
+        return ZstdCompressor(self.get_compress_dictionary(DICT_NAMES[kind], level), level, threads)
+
+    def get_compressor(self, kind: str="zs", level: int=None, threads: int=0) -> ZstdCompressor:
+        key: tuple = (kind, DEFAULT_LEVEL if level is None else level, threads)
+        compressors: Dict[tuple, ZstdCompressor] = self.compressors
+        if key not in compressors:
+            with self.lock:
+                compressors[key] = self.make_compressor(*key)
+        return compressors[key]
+
+    def compress_bytes(self, data: bytes, kind: str="zs", level: int=None, threads: int=0) -> bytes:
+        return self.get_compressor(kind, level, threads)._compress(data)
+
+    # Compresses each buffer as its own frame across a thread pool (zstandard releases the GIL while compressing)
+    # get_compressor hands each worker thread its own compressor
+    def compress_many(self, buffers: List[bytes], kind: str="zs", level: int=None, workers: int=None) -> List[bytes]:
+        def compress(data: bytes) -> bytes:
+            return self.get_compressor(kind, level)._compress(data)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(compress, buffers))
+
+    def decompress(self, filepath: str) -> bytes:
+        if not(filepath.endswith(".zs") or filepath.endswith(".zstd")):
+            return Path(filepath).read_bytes()
+        return self.decompress_bytes(Path(filepath).read_bytes(), self.get_kind(filepath))
     
     def compress(self, filepath: str) -> bytes:
-        if filepath.endswith(".pack.zs"):
-            return self.pack_compress._compress(Path(filepath).read_bytes())
-        elif filepath.endswith(".bcett.byml.zs"):
-            return self.bcett_compress._compress(Path(filepath).read_bytes())
-        else:
-            return self.zs_compress._compress(Path(filepath).read_bytes())
\ No newline at end of file
+        kind: str = self.get_kind(filepath)
+        return self.compress_bytes(Path(filepath).read_bytes(), "zs" if kind == "mc" else kind)
+
+# Process-wide registry of contexts keyed by the normalized ZsDic path
+contexts: Dict[str, ZstdDecompContext] = {}
+contexts_lock: threading.Lock = threading.Lock()
+context_stats: Dict[str, float] = {"Hits" : 0, "Misses" : 0, "Build Time" : 0.0}
+
+def get_context(zsdic_pack_path: str) -> ZstdDecompContext:
+    key: str = os.path.normcase(os.path.realpath(zsdic_pack_path))
+    with contexts_lock:
+        if key in contexts:
+            context_stats["Hits"] += 1
+            return contexts[key]
+        ctx: ZstdDecompContext = ZstdDecompContext(key)
+        contexts[key] = ctx
+        context_stats["Misses"] += 1
+        context_stats["Build Time"] += ctx.build_time
+        return ctx
+
+def get_context_stats() -> Dict[str, float]:
+    with contexts_lock:
+        return dict(context_stats, Contexts=len(contexts))
+
+def clear_contexts() -> None:
+    with contexts_lock:
+        contexts.clear()